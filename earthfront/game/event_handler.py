@@ -3,11 +3,24 @@ Module de gestion des événements du jeu
 """
 import pygame
 import pygame_gui
+from utils.filter_expr import FilterSyntaxError
 from utils.logger import Logger
 from .grid_manager import GridManager
 
 logger = Logger()
 
+# Événement pygame posté quand une requête BDD asynchrone est terminée
+# (attributs : kind, future)
+QUERY_RESULT = pygame.event.custom_type()
+
+
+def post_query_result(kind, future):
+    """Callback de AsyncQueryRunner : remet le résultat à la boucle d'événements"""
+    try:
+        pygame.event.post(pygame.event.Event(QUERY_RESULT, kind=kind, future=future))
+    except pygame.error:
+        pass  # fenêtre déjà fermée
+
 
 class EventHandler:
     """Gère tous les événements du jeu"""
@@ -17,8 +30,7 @@ class EventHandler:
         self.grid_manager: GridManager = self.game.grid_manager_game
         self.is_dragging = False
         self.last_mouse_pos = None
-        self.last_cell = None
-        self.last_cell_color = None
+        self.pending_chunk = None  # future de la dernière case cliquée
 
     def handle_events(self):
         """
@@ -37,12 +49,15 @@ class EventHandler:
                 logger.info("Fenêtre fermée → retour au menu")
                 return False
 
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            # Pendant la saisie d'une expression, les touches vont au champ texte
+            typing = self.game.ui.filter_entry.is_focused
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and not typing:
                 logger.info("ESC → retour au menu")
                 return False
 
             # ── Raccourcis clavier ────────────────────────────────────────
-            elif event.type == pygame.KEYDOWN:
+            elif event.type == pygame.KEYDOWN and not typing:
 
                 # G : toggle grille
                 if event.key == pygame.K_g:
@@ -55,6 +70,12 @@ class EventHandler:
                 elif event.key == pygame.K_F11:
                     self.game.toggle_fullscreen()
 
+                # F5 : sauvegarde rapide (Maj : delta) ; F9 : chargement rapide
+                elif event.key == pygame.K_F5:
+                    self.game.save_world(delta=bool(event.mod & pygame.KMOD_SHIFT))
+                elif event.key == pygame.K_F9:
+                    self.game.quickload()
+
             # ── Redimensionnement ─────────────────────────────────────────
             elif event.type == pygame.VIDEORESIZE:
                 self._handle_resize(event)
@@ -73,6 +94,10 @@ class EventHandler:
             elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                 self._handle_mouse_up()
 
+            # ── Résultats des requêtes BDD ────────────────────────────────
+            elif event.type == QUERY_RESULT:
+                self._handle_query_result(event)
+
             # ── UI Manager ────────────────────────────────────────────────
             self.game.manager.process_events(event)
 
@@ -85,6 +110,11 @@ class EventHandler:
                     else:
                         self.game.apply_resource_filter(self.game.ui.active_filter)
 
+            # ── Expression de filtre (validée par Entrée) ─────────────────
+            elif event.type == pygame_gui.UI_TEXT_ENTRY_FINISHED \
+                    and event.ui_element == self.game.ui.filter_entry:
+                self._handle_filter_expression(event.text)
+
         # ── Boutons UI custom (grille, quit) ──────────────────────────────
         self._update_ui_buttons(mouse_pos, mouse_buttons[0])
 
@@ -142,26 +172,38 @@ class EventHandler:
 
         if cell:
             logger.info(f"Clicked on grid cell: {cell}")
+            self.grid_manager.set_selection(cell[0], cell[1])
 
-            if self.last_cell:
-                if self.last_cell_color != (None, None):
-                    self.grid_manager.set_cell_color(
-                        self.last_cell[0], self.last_cell[1],
-                        self.last_cell_color[0], self.last_cell_color[1]
-                    )
-                    self.last_cell_color = None
-                else:
-                    self.grid_manager.reset_cell(self.last_cell[0], self.last_cell[1])
-
-            self.last_cell_color = self.grid_manager.get_cell_color(cell[0], cell[1])
-            self.grid_manager.set_cell_color(cell[0], cell[1], (225, 225, 80), 150)
-            self.last_cell = (cell[0], cell[1])
-
-            chunk_data = self.game.data_handler.get_chunk_data(cell[0], cell[1])
-            if chunk_data:
-                self.game.ui.update_chunk_info(chunk_data)
-            else:
-                self.game.ui.update_chunk_info(None)
+            # Lecture en arrière-plan, l'info s'affiche à l'arrivée du résultat
+            self.pending_chunk = self.game.queries.chunk_data(cell[0], cell[1])
+
+    def _handle_query_result(self, event):
+        future = event.future
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error(f"Requête {event.kind} en erreur : {future.exception()}")
+            return
+
+        if event.kind == "chunk_data":
+            if future is not self.pending_chunk:
+                return  # une autre case a été cliquée depuis
+            self.pending_chunk = None
+            self.game.ui.update_chunk_info(future.result() or None)
+
+    def _handle_filter_expression(self, text):
+        text = text.strip()
+        if not text:
+            self.game.clear_filter_expression()
+            self.game.ui.set_filter_status("")
+            return
+        try:
+            self.game.apply_filter_expression(text)
+        except FilterSyntaxError as e:
+            logger.warning(f"Expression de filtre invalide : {e}")
+            self.game.ui.set_filter_status(str(e))
+            return
+        self.game.ui.set_filter_status("")
 
     def _update_ui_buttons(self, mouse_pos, mouse_pressed):
         overlay_changed, quit_clicked = self.game.ui.update(mouse_pos, mouse_pressed)
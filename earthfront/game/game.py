@@ -9,16 +9,29 @@ from .ui import GameUI
 from .menu import MainMenu
 from game.ui import RESOURCES
 from .grid_manager import GridManager
-from .event_handler import EventHandler
+from .event_handler import EventHandler, post_query_result
 from .renderer import Renderer
+from .heatmaps import HeatmapCache
 from utils.database_handler import DatabaseHandler
+from utils.async_queries import AsyncQueryRunner
+from utils.save_format import write_save, read_save, apply_delta, SaveError
+from utils.autosave import AutosaveScheduler
+from utils.gen_chunk_bdd import build_world_manifest
+from utils.world_store import WorldStore
 from utils.data_handler import DataManager, Config
 from utils.logger import Logger
 from .loading_screen import LoadingScreen
+import sqlite3
 import threading
+import time
+import os
 
 logger = Logger()
 
+HEATMAP_REFRESH = 1.0  # secondes entre deux vérifications de la carte de chaleur active
+QUICKSAVE       = "quicksave"        # sauvegarde rapide complète (F5)
+QUICKSAVE_DELTA = "quicksave.delta"  # sauvegarde rapide delta (Maj+F5), basée sur la dernière complète
+
 
 class Game:
     """Classe principale du jeu - coordonne tous les modules"""
@@ -126,21 +139,69 @@ class Game:
     def _init_modules(self):
         logger.info("Initializing modules...")
         self.grid_manager_game = GridManager(self.map_width, self.map_height, cell_size=10)
+        self.grid_manager_game.atlas.add("resources", Images.ICON_RESOURCES)
         self.event_handler     = EventHandler(self)
         self.renderer          = Renderer(self)
-        self.data_handler      = DatabaseHandler(self)
 
-        info = self.data_handler.get_world_info()
-        if info['chunk_count'] != 2050:
-            logger.info("Monde non généré — lancement de la génération")
-            self._run_world_generation()
+        # Un monde par (carte, seed, version du générateur), gardé en cache
+        self.world_manifest = build_world_manifest(
+            self.config.world_seed, self.map_width // 10, self.map_height // 10, map_path=Images.CARTES
+        )
+        self.world_store  = WorldStore(max_bytes=self.config.world_cache_max_mb * 1024 * 1024)
+        self.data_handler = DatabaseHandler(
+            self,
+            db_name=self.world_store.get_world_path(self.world_manifest),
+            backend=self.config.chunk_backend,
+            flush_interval=self.config.db_flush_interval,
+        )
+
+        status = self.data_handler.get_world_status(self.world_manifest)
+        if status == "complete":
+            logger.info("Monde déjà généré (manifeste valide), skip")
+        elif self.config.lazy_generation:
+            logger.info(f"Monde à générer (état : {status}) — génération à la demande")
+            self.data_handler.start_lazy_generation(
+                self.config.world_seed, self.map_width // 10, self.map_height // 10, self.world_manifest
+            )
         else:
-            logger.info(f"Monde déjà généré ({info['chunk_count']} chunks), skip")
+            logger.info(f"Monde à générer (état : {status}) — lancement de la génération")
+            self._run_world_generation()
+
+        # Monde entier en mémoire (déjà chargé si la génération paresseuse a démarré)
+        if self.data_handler.store is None:
+            self.data_handler.load_store(self.map_width // 10, self.map_height // 10)
+
+        # Ancienne BDD unique (data/chunk_base.db) : revendications reprises une seule fois
+        legacy = self.world_store.legacy_database()
+        if legacy is not None:
+            try:
+                count = self.data_handler.import_legacy_claims(legacy)
+                self.world_store.retire_legacy_database(legacy)
+                logger.info(f"Ancienne BDD reprise : {count} chunks revendiqués")
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Reprise de l'ancienne BDD impossible : {e}")
+
+        # Lectures hors de la boucle de rendu, résultats reçus en événements pygame
+        self.queries = AsyncQueryRunner(self.data_handler, on_result=post_query_result)
+
+        # Cartes de chaleur des filtres, calculées une fois pour toutes les ressources
+        self.heatmaps = HeatmapCache(
+            self.data_handler, RESOURCES, self.grid_manager_game.num_cols, self.grid_manager_game.num_rows
+        )
+        self.heatmaps.build()
+        self._heatmap_checked = 0.0
+
+        # Copie du monde entre deux frames, écriture dans un thread de fond
+        self.autosave = AutosaveScheduler(
+            self.data_handler, lambda: self.ledgers,
+            interval=self.config.autosave_interval, slots=self.config.autosave_slots,
+        )
 
     def _run_world_generation(self):
         width_chunks  = self.map_width  // 10
         height_chunks = self.map_height // 10
         total         = width_chunks * height_chunks
+        workers       = self.config.generation_workers or os.cpu_count() or 1
 
         state = {"progress": 0.0, "status": "Initialisation...", "done": False, "error": None}
         lock  = threading.Lock()
@@ -153,8 +214,10 @@ class Game:
         def generate():
             try:
                 self.data_handler.generate_world(
-                    seed=55, width=width_chunks, height=height_chunks,
+                    seed=self.config.world_seed, width=width_chunks, height=height_chunks,
                     on_progress=on_chunk_generated,
+                    workers=workers,
+                    manifest=self.world_manifest,
                 )
                 with lock:
                     state["progress"] = 1.0
@@ -199,6 +262,9 @@ class Game:
         self.running     = True
         self.map_surface = None
         self.need_redraw = True
+        self.ledgers     = {}    # soldes des joueurs : {joueur: {ressource: quantité}}
+        self._last_full_save = None  # (nom, époque) : base des sauvegardes delta
+        self.active_expression = None  # expression de filtre affichée (utils.filter_expr)
 
     # ===== PLEIN ÉCRAN EN JEU =====
 
@@ -275,42 +341,132 @@ class Game:
     # ===== FILTRES RESSOURCES =====
 
     def apply_resource_filter(self, resource_key):
-        color = next((c for k, _, c in RESOURCES if k == resource_key), (255, 255, 255))
+        """Affiche la carte de chaleur précalculée de la ressource"""
+        self.active_expression = None
+        self.grid_manager_game.set_heatmap(self.heatmaps.get(resource_key))
+        self.need_redraw = True
+        logger.info(f"Filter applied: {resource_key}")
 
-        # WHERE > 0 directement en SQL, évite de rapatrier les zéros
-        cur = self.data_handler.conn.cursor()
-        cur.execute(f"SELECT position, {resource_key} FROM chunk WHERE {resource_key} > 0")
-        rows = cur.fetchall()
+    def clear_resource_filter(self):
+        self.grid_manager_game.set_heatmap(None)
+        self.need_redraw = True
+        logger.info("Resource filter cleared")
 
-        if not rows:
+    def apply_filter_expression(self, expression):
+        """
+        Affiche les chunks retenus par une expression (voir utils.filter_expr).
+        Lève FilterSyntaxError si l'expression est invalide.
+        """
+        surface = self.heatmaps.get_expression(expression)
+        self.ui.clear_active_filter()
+        self.active_expression = expression
+        self.grid_manager_game.set_heatmap(surface)
+        self.need_redraw = True
+        logger.info(f"Filter expression applied: {expression}")
+
+    def clear_filter_expression(self):
+        if self.active_expression is None:
+            return
+        self.active_expression = None
+        self.clear_resource_filter()
+
+    def _reapply_filter(self):
+        """Réaffiche le filtre actif (bouton ou expression) avec les données courantes"""
+        if self.active_expression is not None:
+            self.apply_filter_expression(self.active_expression)
+        elif self.ui.active_filter is not None:
+            self.apply_resource_filter(self.ui.active_filter)
+
+    def _refresh_heatmap(self):
+        """Recalcule la carte du filtre actif si le monde a changé (au plus toutes les HEATMAP_REFRESH s)"""
+        if self.ui.active_filter is None and self.active_expression is None:
+            return
+        now = time.monotonic()
+        if now - self._heatmap_checked < HEATMAP_REFRESH:
             return
+        self._heatmap_checked = now
+        if self.heatmaps.stale:
+            self._reapply_filter()
+
+    # ===== SAUVEGARDES =====
+
+    def save_world(self, name=None, delta=False):
+        """
+        Sauvegarde le monde dans data/saves/<name>.efs (QUICKSAVE, ou
+        QUICKSAVE_DELTA pour un delta, par défaut).
+        delta=True : seuls les chunks modifiés depuis la dernière sauvegarde
+        complète de la session sont écrits (sauvegarde complète sinon).
+        Retourne False si la sauvegarde n'a pas pu être écrite.
+        """
+        base = self._last_full_save if delta else None
+        if name is None:
+            name = QUICKSAVE_DELTA if base else QUICKSAVE
+        if base and name == base[0]:
+            # Le delta remplacerait la sauvegarde complète dont il dépend
+            logger.error(f"Cannot write a delta over its own base save: {name}")
+            return False
+        state = self.data_handler.snapshot(self.ledgers, base_epoch=base[1] if base else None)
 
-        max_val = max(v for _, v in rows) or 1
+        dm = DataManager()
+        try:
+            size = write_save(dm.save_path(name), state)
+        except OSError as e:
+            logger.error(f"Cannot write save {name}: {e}")
+            return False
+        dm.register_save(name, {
+            "kind":    "delta" if base else "full",
+            "base":    base[0] if base else None,
+            "created": state.created,
+            "size":    size,
+        })
+        if base is None:
+            self._last_full_save = (name, state.epoch)
+        logger.info(f"World saved: {name} ({'delta' if base else 'full'}, {size // 1024} Ko)")
+        return True
 
-        # Batch write direct dans grid_cells — évite N set_cell_color
-        # et donc N "_overlay_dirty = True" inutiles
-        gm = self.grid_manager_game
-        gm.grid_cells.clear()
+    def quickload(self):
+        """Recharge la plus récente des sauvegardes rapides (complète ou delta)"""
+        dm = DataManager()
+        saves = [(info.get("created", 0), name) for name in (QUICKSAVE, QUICKSAVE_DELTA)
+                 if (info := dm.get_save(name)) is not None]
+        if not saves:
+            logger.warning("No quicksave to load")
+            return False
+        return self.load_world(max(saves)[1])
 
-        r, g, b = color
-        for position_str, value in rows:
-            try:
-                x, y = map(int, position_str.split(";"))
-            except ValueError:
-                continue
-            if not (0 <= x < gm.num_cols and 0 <= y < gm.num_rows):
-                continue
-            alpha = int(30 + (value / max_val) * 190)
-            gm.grid_cells[(x, y)] = {'color': (r, g, b), 'alpha': alpha}
-
-        gm._overlay_dirty = True  # un seul dirty à la fin
-        self.need_redraw = True
-        logger.info(f"Filter applied: {resource_key} ({len(rows)} chunks)")
+    def load_world(self, name=QUICKSAVE):
+        """Recharge une sauvegarde (et sa sauvegarde de base pour un delta)"""
+        dm = DataManager()
+        info = dm.get_save(name)
+        if info is None:
+            logger.error(f"Save not found: {name}")
+            return False
 
-    def clear_resource_filter(self):
-        self.grid_manager_game.clear_all_cells()
+        try:
+            state = read_save(dm.save_path(name))
+            if info.get("base"):
+                state = apply_delta(read_save(dm.save_path(info["base"])), state)
+            self.ledgers = self.data_handler.restore_snapshot(state)
+        except (SaveError, OSError, ValueError) as e:
+            logger.error(f"Cannot load save {name}: {e}")
+            return False
+        self._reapply_filter()
         self.need_redraw = True
-        logger.info("Resource filter cleared")
+        logger.info(f"World loaded: {name}")
+        return True
+
+    # ===== GÉNÉRATION À LA DEMANDE =====
+
+    def _update_generation_focus(self):
+        """Indique au générateur paresseux la zone de chunks visible"""
+        generator = self.data_handler.lazy_generator
+        if generator is None:
+            return
+
+        cs = self.grid_manager_game.cell_size
+        left, top     = self.camera.screen_to_world((0, 0))
+        right, bottom = self.camera.screen_to_world((self.camera.viewport_width, self.camera.viewport_height))
+        generator.set_focus(int(left // cs), int(top // cs), int(right // cs), int(bottom // cs))
 
     # ===== BOUCLE PRINCIPALE =====
 
@@ -330,16 +486,25 @@ class Game:
         if not hasattr(self, "running"):
             return "EXIT"
 
-        while self.running:
-            if not self.event_handler.handle_events():
-                # ESC ou croix en jeu → retour au menu (pas de pygame.quit() !)
-                self.running = False
-                return None  # main.py reboucle → retour au menu
-
-            if self.need_restart:
-                return "RESTART"
-
-            self.renderer.render()
+        try:
+            while self.running:
+                if not self.event_handler.handle_events():
+                    # ESC ou croix en jeu → retour au menu (pas de pygame.quit() !)
+                    self.running = False
+                    return None  # main.py reboucle → retour au menu
+
+                if self.need_restart:
+                    return "RESTART"
+
+                self._update_generation_focus()
+                self.autosave.tick()
+                self._refresh_heatmap()
+                self.renderer.render()
+        finally:
+            # Arrête les requêtes et la génération de fond, écrit les modifications en attente
+            self.queries.shutdown()
+            self.autosave.stop()
+            self.data_handler.close_connection()
 
         # Ne JAMAIS appeler pygame.quit() ici — c'est main.py qui gère ça
         return None
\ No newline at end of file
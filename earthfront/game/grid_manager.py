@@ -2,14 +2,32 @@
 Module de gestion de la grille de ressources
 Gère l'affichage et la manipulation des cellules 10x10px
 """
+import numpy as np
 import pygame
 from utils.logger import Logger
+from .overlay_layers import LayerCompositor
+from .sprite_atlas import SpriteAtlas, NO_SPRITE
 
 logger = Logger()
 
+# Couches d'overlay par défaut : (nom, z). La couche "cells" reçoit les
+# appels set_cell_color / reset_cell sans couche précisée.
+DEFAULT_LAYERS = (
+    ("filter",    0),    # carte de chaleur / expression du filtre actif
+    ("cells",     10),   # cases colorées
+    ("claims",    20),   # territoires revendiqués
+    ("buildings", 30),   # marqueurs de bâtiments
+    ("selection", 100),  # case sélectionnée
+)
+SELECTION_COLOR = (225, 225, 80)
+SELECTION_ALPHA = 150
+LINE_CACHE_SIZE = 10   # niveaux de zoom dont les positions de lignes sont gardées
+LINE_BLOCK_PX   = 512  # marge (px) du motif de grille : reconstruit tous les LINE_BLOCK_PX de déplacement
+LINE_FILL_MAX   = 96   # jusqu'à ce nombre de lignes visibles, un fill par ligne coûte moins que le motif
+
 
 class GridManager:
-    """Gère la grille de ressources avec coloration et images"""
+    """Gère la grille de ressources avec coloration et icônes"""
 
     def __init__(self, map_width, map_height, cell_size=10):
         self.map_width  = map_width
@@ -19,8 +37,9 @@ class GridManager:
         self.num_cols = map_width  // cell_size
         self.num_rows = map_height // cell_size
 
-        # Données brutes des cellules {(x, y): {'color': (r,g,b), 'alpha': int, 'image': Surface}}
-        self.grid_cells = {}
+        # Icônes des cellules : identifiant de sprite de l'atlas par cellule (NO_SPRITE = aucune)
+        self.atlas = SpriteAtlas()
+        self.cell_sprites = np.full((self.num_rows, self.num_cols), NO_SPRITE, dtype=np.int16)
 
         # Visibilité
         self.visible = False
@@ -29,54 +48,127 @@ class GridManager:
         self.grid_color      = (121, 122, 125)
         self.grid_line_width = 1
 
-        # ── Overlay précalculée ──────────────────────────────────────────────
-        # Surface SRCALPHA à la résolution de la carte (1px = 1px monde).
-        # Elle est redessinée seulement quand grid_cells change, pas à chaque frame.
-        self._overlay: pygame.Surface | None = None
-        self._overlay_dirty = True
+        # ── Overlays ─────────────────────────────────────────────────────────
+        # Couleurs : couches à la résolution des cellules (1px = 1 cellule), chacune
+        # avec son cache et ses cellules modifiées, composées dans une surface
+        # prémultipliée agrandie au plus proche voisin à l'affichage.
+        self.overlay = LayerCompositor(self.num_cols, self.num_rows)
+        for name, z in DEFAULT_LAYERS:
+            self.overlay.add_layer(name, z)
+        self.selected_cell = None
+        self._sprites_dirty = False  # icônes modifiées depuis le dernier draw
+
+        # Copies agrandies de la partie visible : {nom: (clé de vue, surface)}.
+        # Réutilisées tant que la caméra ne bouge pas ; les cellules modifiées y
+        # sont repeintes directement.
+        self._scaled = {}
+
+        # Positions des lignes de grille (pixels depuis l'origine de la carte) par zoom
+        self._line_positions = {}
+        # Motif des lignes (surface à colorkey RLE) : (clé, surface, origine en pixels)
+        self._line_pattern = None
 
         logger.info(f"GridManager initialized: {self.num_cols}x{self.num_rows} cells")
 
     # ── API publique ─────────────────────────────────────────────────────────
 
-    def set_cell_color(self, x, y, color, alpha=180):
+    def layer(self, name):
+        """Couche d'overlay (OverlayLayer) par nom"""
+        return self.overlay.layers[name]
+
+    def add_layer(self, name, z=0, visible=True):
+        return self.overlay.add_layer(name, z, visible)
+
+    def set_layer_visible(self, name, visible):
+        self.overlay.set_visible(name, visible)
+
+    def set_cell_color(self, x, y, color, alpha=180, layer="cells"):
         if not (0 <= x < self.num_cols and 0 <= y < self.num_rows):
             logger.warning(f"Cell ({x}, {y}) out of bounds")
             return False
 
-        cell = self.grid_cells.setdefault((x, y), {})
-        cell['color'] = color
-        cell['alpha'] = alpha
-        self._overlay_dirty = True
+        self.overlay.layers[layer].set_cell(x, y, color, alpha)
         return True
 
-    def set_cell_image(self, x, y, image_surface, alpha=255):
+    def set_cells_color(self, xs, ys, color, alpha=180, layer="cells"):
+        """
+        Colore plusieurs cellules en une opération numpy.
+        xs, ys : tableaux d'indices ; color : (r, g, b) ou tableau (n, 3) ;
+        alpha : entier ou tableau (n,). Les indices hors grille sont ignorés.
+        """
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        inside = (xs >= 0) & (xs < self.num_cols) & (ys >= 0) & (ys < self.num_rows)
+        color = np.asarray(color)
+        alpha = np.asarray(alpha)
+        self.overlay.layers[layer].set_cells(
+            xs[inside], ys[inside],
+            color if color.ndim == 1 else color[inside],
+            alpha if alpha.ndim == 0 else alpha[inside],
+        )
+        return int(inside.sum())
+
+    def set_cell_sprite(self, x, y, sprite):
+        """Place l'icône sprite (nom ou identifiant de self.atlas) sur la cellule"""
         if not (0 <= x < self.num_cols and 0 <= y < self.num_rows):
             logger.warning(f"Cell ({x}, {y}) out of bounds")
             return False
 
-        scaled = pygame.transform.scale(image_surface, (self.cell_size, self.cell_size))
-        scaled.set_alpha(alpha)
-
-        cell = self.grid_cells.setdefault((x, y), {})
-        cell['image'] = scaled
-        cell['alpha'] = alpha
-        self._overlay_dirty = True
+        self.cell_sprites[y, x] = self.atlas.id_of(sprite)
+        self._sprites_dirty = True
         return True
 
-    def reset_cell(self, x, y):
-        existed = (x, y) in self.grid_cells
-        if existed:
-            del self.grid_cells[(x, y)]
-            self._overlay_dirty = True
+    def set_cells_sprite(self, xs, ys, sprite):
+        """Place la même icône sur plusieurs cellules en une opération numpy"""
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        inside = (xs >= 0) & (xs < self.num_cols) & (ys >= 0) & (ys < self.num_rows)
+        self.cell_sprites[ys[inside], xs[inside]] = self.atlas.id_of(sprite)
+        self._sprites_dirty = True
+        return int(inside.sum())
+
+    def set_cell_image(self, x, y, image_surface, alpha=255):
+        """Place une image quelconque : elle est ajoutée une fois à l'atlas puis référencée"""
+        return self.set_cell_sprite(x, y, self.atlas.add_surface(image_surface, alpha))
+
+    def reset_cell(self, x, y, layer="cells"):
+        """Efface la couleur de la cellule dans la couche (et son icône pour "cells")"""
+        if not (0 <= x < self.num_cols and 0 <= y < self.num_rows):
+            return False
+        existed = self.overlay.layers[layer].clear_cell(x, y)
+        if layer == "cells" and self.cell_sprites[y, x] != NO_SPRITE:
+            self.cell_sprites[y, x] = NO_SPRITE
+            self._sprites_dirty = True
+            existed = True
         return existed
 
-    def clear_all_cells(self):
-        count = len(self.grid_cells)
-        self.grid_cells.clear()
-        self._overlay_dirty = True
+    def clear_all_cells(self, layer="cells"):
+        count = self.modified_cells
+        self.overlay.layers[layer].clear()
+        if layer == "cells":
+            self.cell_sprites[...] = NO_SPRITE
+            self._sprites_dirty = True
         logger.info(f"All cells cleared ({count} cells)")
 
+    @property
+    def modified_cells(self):
+        """Nombre de cellules colorées (couche "cells") ou portant une icône"""
+        colored = self.overlay.layers["cells"].rgba[..., 3] > 0
+        return int(np.count_nonzero(colored | (self.cell_sprites != NO_SPRITE)))
+
+    def set_heatmap(self, surface):
+        """Affiche une carte de chaleur (num_cols x num_rows) dans la couche "filter", ou None pour la retirer"""
+        self.overlay.layers["filter"].load_surface(surface)
+
+    def set_selection(self, x, y, color=SELECTION_COLOR, alpha=SELECTION_ALPHA):
+        """Met la case (x, y) en surbrillance ; la précédente est effacée de la couche "selection" """
+        self.clear_selection()
+        if self.set_cell_color(x, y, color, alpha, layer="selection"):
+            self.selected_cell = (x, y)
+
+    def clear_selection(self):
+        if self.selected_cell is not None:
+            self.overlay.layers["selection"].clear_cell(*self.selected_cell)
+            self.selected_cell = None
+
     def get_cell_at_world_position(self, world_x, world_y):
         x = int(world_x // self.cell_size)
         y = int(world_y // self.cell_size)
@@ -84,11 +176,10 @@ class GridManager:
             return x, y
         return None
 
-    def get_cell_color(self, x, y):
-        cell = self.grid_cells.get((x, y))
-        if cell and 'color' in cell:
-            return cell['color'], cell.get('alpha', 255)
-        return None, None
+    def get_cell_color(self, x, y, layer="cells"):
+        if not (0 <= x < self.num_cols and 0 <= y < self.num_rows):
+            return None, None
+        return self.overlay.layers[layer].get_cell(x, y)
 
     def toggle_visibility(self):
         self.visible = not self.visible
@@ -98,14 +189,21 @@ class GridManager:
     def show(self): self.visible = True
     def hide(self): self.visible = False
 
+    @property
+    def dirty(self):
+        """True si un overlay a changé depuis le dernier draw (le renderer doit redessiner)"""
+        return self.overlay.dirty or self._sprites_dirty
+
     def get_stats(self):
         return {
             'total_cells':    self.num_cols * self.num_rows,
-            'modified_cells': len(self.grid_cells),
+            'modified_cells': self.modified_cells,
             'grid_size':      f"{self.num_cols}x{self.num_rows}",
             'cell_size':      f"{self.cell_size}px",
             'visible':        self.visible,
-            'overlay_dirty':  self._overlay_dirty,
+            'overlay_dirty':  self.dirty,
+            'sprites':        len(self.atlas),
+            'layers':         {name: layer.visible for name, layer in self.overlay.layers.items()},
         }
 
     # ── Rendu ────────────────────────────────────────────────────────────────
@@ -122,93 +220,174 @@ class GridManager:
         start_row = max(0,             int(top_left[1]     // self.cell_size) - 1)
         end_row   = min(self.num_rows, int(bottom_right[1] // self.cell_size) + 2)
 
-        # 1) Overlay des cellules colorées (un seul blit par frame)
-        self._draw_cells_overlay(surface, camera)
+        # 1) Couches colorées (filtre, cases, sélection...) composées, puis icônes
+        self._update_overlay()
+        if not self.overlay.empty:
+            self._draw_cell_surface(surface, camera, "overlay", self.overlay.surface,
+                                    start_row, end_row, start_col, end_col,
+                                    special_flags=pygame.BLEND_PREMULTIPLIED)
+        self._draw_sprites(surface, camera, start_row, end_row, start_col, end_col)
 
         # 2) Lignes de grille par-dessus
         self._draw_grid_lines(surface, camera, start_row, end_row, start_col, end_col)
 
-    def _rebuild_overlay(self):
+    def _update_overlay(self):
         """
-        Reconstruit l'overlay à la résolution de la carte (1px monde = 1px).
-        Appelée une seule fois après chaque modification des données,
-        pas à chaque frame.
+        Recompose les couches modifiées. Seules les cellules changées sont
+        repeintes dans la copie agrandie : un changement de sélection coûte
+        quelques µs, pas une recomposition.
         """
-        self._overlay = pygame.Surface((self.map_width, self.map_height), pygame.SRCALPHA)
-        self._overlay.fill((0, 0, 0, 0))
-
-        cs = self.cell_size
-        for (gx, gy), cell in self.grid_cells.items():
-            px = gx * cs
-            py = gy * cs
-
-            if 'color' in cell:
-                r, g, b = cell['color']
-                a = cell.get('alpha', 180)
-                self._overlay.fill((r, g, b, a), pygame.Rect(px, py, cs, cs))
-
-            if 'image' in cell:
-                self._overlay.blit(cell['image'], (px, py))
-
-        self._overlay_dirty = False
-        logger.debug(f"Overlay rebuilt ({len(self.grid_cells)} cells)")
-
-    def _draw_cells_overlay(self, surface, camera):
+        changes = self.overlay.update()
+        if changes == "all":
+            self._scaled.pop("overlay", None)
+        elif changes:
+            scaled = self._scaled.get("overlay")
+            if scaled is not None:
+                for (x, y), rgba in changes.items():
+                    self._fill_scaled_cell(scaled, x, y, rgba)
+
+    @staticmethod
+    def _fill_scaled_cell(scaled, x, y, rgba):
         """
-        Scale et blit l'overlay visible en un seul appel par frame.
-        Remplace les N allocations de Surface + N blits de l'ancienne version.
+        Repeint la cellule (x, y) dans une copie agrandie.
+        transform.scale prend pour le pixel d la source d * n // D : la cellule i
+        couvre donc les pixels [ceil(i * D / n), ceil((i + 1) * D / n)).
         """
-        if not self.grid_cells:
+        (_, start_col, start_row, end_col, end_row, dst_w, dst_h), surface = scaled
+        if not (start_col <= x < end_col and start_row <= y < end_row):
             return
-
-        if self._overlay_dirty or self._overlay is None:
-            self._rebuild_overlay()
-
-        # Région monde visible
-        top_left     = camera.screen_to_world((0, 0))
-        bottom_right = camera.screen_to_world((camera.viewport_width, camera.viewport_height))
-
-        src_x = max(0, int(top_left[0]) - 1)
-        src_y = max(0, int(top_left[1]) - 1)
-        src_w = min(self.map_width,  int(bottom_right[0]) + 2) - src_x
-        src_h = min(self.map_height, int(bottom_right[1]) + 2) - src_y
-
-        if src_w <= 0 or src_h <= 0:
+        cols, rows = end_col - start_col, end_row - start_row
+        i, j = x - start_col, y - start_row
+        left,  right  = -(-i * dst_w // cols), -(-(i + 1) * dst_w // cols)
+        top,   bottom = -(-j * dst_h // rows), -(-(j + 1) * dst_h // rows)
+        surface.fill(rgba, pygame.Rect(left, top, right - left, bottom - top))
+
+    def _draw_cell_surface(self, surface, camera, name, cells, start_row, end_row, start_col, end_col,
+                           special_flags=0):
+        """
+        Agrandit la partie visible d'une surface à la résolution des cellules
+        (1px = 1 cellule) au plus proche voisin, en un seul blit.
+        La copie agrandie est gardée sous name et réutilisée tant que la vue
+        et la surface source sont les mêmes.
+        """
+        if cells is None or end_col <= start_col or end_row <= start_row:
             return
 
-        # Extraire uniquement la portion visible (évite de scaler toute la carte)
-        src_rect    = pygame.Rect(src_x, src_y, src_w, src_h)
-        visible_sub = self._overlay.subsurface(src_rect)
-
-        # Calculer la taille de destination en pixels entiers
-        sx0, sy0 = camera.world_to_screen((src_x, src_y))
-        sx1, sy1 = camera.world_to_screen((src_x + src_w, src_y + src_h))
+        cs = self.cell_size
+        sx0, sy0 = camera.world_to_screen((start_col * cs, start_row * cs))
+        sx1, sy1 = camera.world_to_screen((end_col * cs, end_row * cs))
 
         dst_w = round(sx1) - round(sx0)
         dst_h = round(sy1) - round(sy0)
-
         if dst_w <= 0 or dst_h <= 0:
             return
 
-        # 1 scale + 1 blit = tout ce qu'on fait par frame
-        scaled = pygame.transform.scale(visible_sub, (dst_w, dst_h))
-        surface.blit(scaled, (round(sx0), round(sy0)))
+        key = (cells, start_col, start_row, end_col, end_row, dst_w, dst_h)
+        cached = self._scaled.get(name)
+        if cached is None or cached[0] != key:
+            visible_sub = cells.subsurface(
+                pygame.Rect(start_col, start_row, end_col - start_col, end_row - start_row)
+            )
+            cached = (key, pygame.transform.scale(visible_sub, (dst_w, dst_h)))
+            self._scaled[name] = cached
+        surface.blit(cached[1], (round(sx0), round(sy0)), special_flags=special_flags)
+
+    def _draw_sprites(self, surface, camera, start_row, end_row, start_col, end_col):
+        """
+        Toutes les icônes visibles en un seul Surface.blits, depuis l'atlas
+        réduit à la taille des cellules à l'écran (une copie par bande de zoom).
+        """
+        self._sprites_dirty = False
+        size = round(self.cell_size * camera.zoom)
+        if size <= 0 or not len(self.atlas):
+            return
+        visible = self.cell_sprites[start_row:end_row, start_col:end_col]
+        rows, cols = np.nonzero(visible != NO_SPRITE)
+        if rows.size == 0:
+            return
+
+        atlas, rects = self.atlas.scaled(size)
+        xs, ys = self._get_line_positions(camera.zoom)
+        ox, oy = (round(v) for v in camera.world_to_screen((0, 0)))
+        px = (xs[cols + start_col] + ox).tolist()
+        py = (ys[rows + start_row] + oy).tolist()
+        ids = visible[rows, cols].tolist()
+        surface.blits([(atlas, (x, y), rects[i]) for x, y, i in zip(px, py, ids)], doreturn=False)
+
+    def _get_line_positions(self, zoom):
+        """
+        Positions (pixels écran depuis l'origine de la carte) des lignes
+        verticales et horizontales, calculées une fois par niveau de zoom :
+        le motif de la grille ne dépend que du zoom, la caméra ne fait que le décaler.
+        """
+        positions = self._line_positions.get(zoom)
+        if positions is None:
+            step = self.cell_size * zoom
+            positions = (np.rint(np.arange(self.num_cols + 1) * step).astype(np.int32),
+                         np.rint(np.arange(self.num_rows + 1) * step).astype(np.int32))
+            self._line_positions[zoom] = positions
+            if len(self._line_positions) > LINE_CACHE_SIZE:
+                del self._line_positions[next(iter(self._line_positions))]
+        return positions
 
     def _draw_grid_lines(self, surface, camera, start_row, end_row, start_col, end_col):
-        for i in range(start_col, end_col + 1):
-            x = i * self.cell_size
-            world_start = (x, max(0,               start_row * self.cell_size))
-            world_end   = (x, min(self.map_height, end_row   * self.cell_size))
-            pygame.draw.line(surface, self.grid_color,
-                             camera.world_to_screen(world_start),
-                             camera.world_to_screen(world_end),
-                             self.grid_line_width)
-
-        for i in range(start_row, end_row + 1):
-            y = i * self.cell_size
-            world_start = (max(0,              start_col * self.cell_size), y)
-            world_end   = (min(self.map_width, end_col   * self.cell_size), y)
-            pygame.draw.line(surface, self.grid_color,
-                             camera.world_to_screen(world_start),
-                             camera.world_to_screen(world_end),
-                             self.grid_line_width)
\ No newline at end of file
+        """
+        Peu de lignes visibles (zoom fort) : un fill par ligne. Sinon, un seul
+        blit depuis un motif à colorkey RLE (quasi entièrement transparent, donc
+        rapide à blitter), qui couvre la vue plus une marge alignée par blocs :
+        il n'est redessiné qu'en changeant de zoom ou après LINE_BLOCK_PX de
+        déplacement.
+        """
+        if end_col <= start_col or end_row <= start_row:
+            return
+        xs, ys = self._get_line_positions(camera.zoom)
+        ox, oy = (round(v) for v in camera.world_to_screen((0, 0)))
+        lw = self.grid_line_width
+        if (end_col - start_col) + (end_row - start_row) + 2 <= LINE_FILL_MAX:
+            self._fill_grid_lines(surface, xs, ys, ox, oy, start_row, end_row, start_col, end_col)
+            return
+
+        block = max(1, int(LINE_BLOCK_PX // (self.cell_size * camera.zoom)))
+        c0, r0 = start_col // block * block, start_row // block * block
+        c1 = min(self.num_cols, -(-end_col // block) * block)
+        r1 = min(self.num_rows, -(-end_row // block) * block)
+
+        key = (camera.zoom, c0, r0, c1, r1, self.grid_color, lw)
+        if self._line_pattern is None or self._line_pattern[0] != key:
+            self._line_pattern = (key, *self._build_line_pattern(xs, ys, c0, r0, c1, r1))
+        _, pattern, (px, py) = self._line_pattern
+
+        area = pygame.Rect(int(xs[start_col]) - px - lw // 2, int(ys[start_row]) - py - lw // 2,
+                           int(xs[end_col] - xs[start_col]) + lw, int(ys[end_row] - ys[start_row]) + lw)
+        surface.blit(pattern, (px + ox + area.x, py + oy + area.y), area)
+
+    def _fill_grid_lines(self, surface, xs, ys, ox, oy, start_row, end_row, start_col, end_col):
+        """Un fill par ligne visible"""
+        lw, half = self.grid_line_width, self.grid_line_width // 2
+
+        top    = int(ys[start_row]) + oy
+        bottom = int(ys[end_row])   + oy + lw
+        for x in (xs[start_col:end_col + 1] + (ox - half)).tolist():
+            surface.fill(self.grid_color, (x, top, lw, bottom - top))
+
+        left  = int(xs[start_col]) + ox
+        right = int(xs[end_col])   + ox + lw
+        for y in (ys[start_row:end_row + 1] + (oy - half)).tolist():
+            surface.fill(self.grid_color, (left, y, right - left, lw))
+
+    def _build_line_pattern(self, xs, ys, c0, r0, c1, r1):
+        """Dessine les lignes des cellules [c0, c1) x [r0, r1) ; retourne (surface, origine)"""
+        lw, half = self.grid_line_width, self.grid_line_width // 2
+        px, py = int(xs[c0]) - half, int(ys[r0]) - half
+        width  = int(xs[c1] - xs[c0]) + lw
+        height = int(ys[r1] - ys[r0]) + lw
+
+        colorkey = (255, 0, 255) if tuple(self.grid_color[:3]) == (0, 0, 0) else (0, 0, 0)
+        pattern = pygame.Surface((width, height))
+        pattern.fill(colorkey)
+        for x in (xs[c0:c1 + 1] - xs[c0]).tolist():
+            pattern.fill(self.grid_color, (x, 0, lw, height))
+        for y in (ys[r0:r1 + 1] - ys[r0]).tolist():
+            pattern.fill(self.grid_color, (0, y, width, lw))
+        pattern.set_colorkey(colorkey, pygame.RLEACCEL)
+        return pattern, (px, py)
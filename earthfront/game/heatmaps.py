@@ -0,0 +1,121 @@
+"""
+Cartes de chaleur des ressources.
+Une surface par ressource, à la résolution des chunks (1px = 1 chunk),
+calculée en une passe numpy et gardée en cache : changer de filtre revient
+à changer de surface. Les expressions de filtre (utils.filter_expr) sont
+rendues de la même façon et les plus récentes gardées en cache.
+"""
+import time
+from collections import OrderedDict
+import numpy as np
+import pygame
+from utils.logger import Logger
+
+logger = Logger()
+
+MIN_ALPHA   = 30   # opacité d'un chunk où la ressource est à peine présente
+ALPHA_RANGE = 190  # opacité ajoutée pour le maximum de la ressource
+
+# Expressions de filtre : couleur unie, ou dégradé si "weighted colour by"
+FILTER_COLOR     = (255, 80, 200)
+FILTER_ALPHA     = 170
+RAMP_LOW         = np.array((40, 80, 255), dtype=np.float32)
+RAMP_HIGH        = np.array((255, 60, 40), dtype=np.float32)
+EXPRESSION_CACHE = 16  # surfaces d'expressions gardées
+
+
+def heatmap_alpha(values, max_value):
+    """Opacité (uint8) de chaque chunk : 0 sans ressource, 30..220 sinon"""
+    scale = ALPHA_RANGE / max(int(max_value), 1)
+    alpha = MIN_ALPHA + values.astype(np.float32) * scale
+    return np.where(values > 0, alpha, 0).astype(np.uint8)
+
+
+def make_cell_surface(color, alpha):
+    """Surface SRCALPHA (largeur, hauteur) de couleur unie, opacité par pixel"""
+    height, width = alpha.shape
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    surface.fill((*color, 0))
+    pixels_alpha = pygame.surfarray.pixels_alpha(surface)
+    pixels_alpha[...] = alpha.T  # surfarray est indexé [x, y]
+    del pixels_alpha  # libère le verrou de la surface
+    return surface
+
+
+def make_filter_surface(mask, intensity=None):
+    """Surface d'une expression : chunks retenus en couleur unie ou en dégradé"""
+    height, width = mask.shape
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    if intensity is None:
+        surface.fill((*FILTER_COLOR, 0))
+    else:
+        pixels = pygame.surfarray.pixels3d(surface)
+        ramp = RAMP_LOW + (RAMP_HIGH - RAMP_LOW) * intensity.T[..., None]
+        pixels[...] = ramp.astype(np.uint8)
+        del pixels
+    pixels_alpha = pygame.surfarray.pixels_alpha(surface)
+    pixels_alpha[...] = np.where(mask.T, FILTER_ALPHA, 0).astype(np.uint8)
+    del pixels_alpha
+    return surface
+
+
+class HeatmapCache:
+    """Surfaces des ressources, reconstruites seulement quand le monde a changé"""
+
+    def __init__(self, data_handler, resources, num_cols, num_rows):
+        """resources : [(clé, libellé, couleur)] comme game.ui.RESOURCES"""
+        self.data_handler = data_handler
+        self.colors   = {key: color for key, _, color in resources}
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self._surfaces = {}
+        self._expressions = OrderedDict()  # texte → surface, du plus ancien au plus récent
+        self._epoch = None  # époque du store au dernier calcul
+
+    def _world_epoch(self):
+        store = self.data_handler.store
+        return store.epoch if store is not None else None
+
+    @property
+    def stale(self):
+        return self._epoch is None or self._world_epoch() != self._epoch
+
+    def build(self):
+        """Calcule toutes les cartes de chaleur en une lecture des colonnes"""
+        start = time.perf_counter()
+        epoch = self._world_epoch()
+        region = self.data_handler.get_chunks_in_rect(
+            0, 0, self.num_cols - 1, self.num_rows - 1, columns=tuple(self.colors)
+        )
+        for key, color in self.colors.items():
+            max_value = self.data_handler.get_resource_stats(key)["max"]
+            self._surfaces[key] = make_cell_surface(color, heatmap_alpha(region[key], max_value))
+        self._expressions.clear()
+        self._epoch = epoch
+        logger.info(f"Heatmaps built ({len(self._surfaces)} resources, "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    def get(self, key):
+        """Surface de la ressource (reconstruite si le monde a changé)"""
+        if self.stale:
+            self.build()
+        return self._surfaces.get(key)
+
+    def get_expression(self, expression):
+        """
+        Surface d'une expression de filtre (ex. "gold > 50 and water < 30").
+        Lève FilterSyntaxError si l'expression est invalide.
+        """
+        if self.stale:
+            self.build()
+        key = " ".join(expression.split())
+        surface = self._expressions.get(key)
+        if surface is None:
+            mask, intensity = self.data_handler.evaluate_filter(key)
+            surface = make_filter_surface(mask, intensity)
+            self._expressions[key] = surface
+            if len(self._expressions) > EXPRESSION_CACHE:
+                self._expressions.popitem(last=False)
+        else:
+            self._expressions.move_to_end(key)
+        return surface
@@ -0,0 +1,202 @@
+"""
+Couches d'overlay de la grille (filtre, cases colorées, revendications,
+bâtiments, sélection...).
+Chaque couche est à la résolution des cellules (1px = 1 cellule), garde sa
+propre version prémultipliée et ses cellules modifiées ; le compositeur les
+superpose par ordre z (opérateur "over" en alpha prémultiplié) et ne
+recalcule que ce qui a changé.
+"""
+import numpy as np
+import pygame
+
+
+def premultiply(rgba):
+    """(…, 4) uint8 RGBA → (…, 4) uint8 RGB * A / 255, A"""
+    out = rgba.astype(np.uint16)
+    out[..., :3] = (out[..., :3] * out[..., 3:4] + 127) // 255
+    return out.astype(np.uint8)
+
+
+def composite_over(layers, index=...):
+    """
+    Superpose les versions prémultipliées des couches (de la plus basse à la
+    plus haute) : out = couche + out * (1 - alpha_couche).
+    index : cellules à calculer (tout par défaut, ou (ys, xs)).
+    """
+    out = None
+    for layer in layers:
+        src = layer.premultiplied[index].astype(np.float32)
+        if out is None:
+            out = src
+        else:
+            out = src + out * (1.0 - src[..., 3:4] / 255.0)
+    return out
+
+
+class OverlayLayer:
+    """Une couche : couleurs RGBA par cellule (alpha 0 = transparent)"""
+
+    def __init__(self, name, num_cols, num_rows, z=0, visible=True):
+        self.name    = name
+        self.z       = z
+        self.visible = visible
+        self.rgba          = np.zeros((num_rows, num_cols, 4), dtype=np.uint8)
+        self.premultiplied = np.zeros((num_rows, num_cols, 4), dtype=np.uint8)
+        self.dirty_all   = False  # toute la couche à recalculer
+        self.dirty_cells = set()  # sinon, seulement ces cellules (x, y)
+
+    @property
+    def num_rows(self):
+        return self.rgba.shape[0]
+
+    @property
+    def num_cols(self):
+        return self.rgba.shape[1]
+
+    @property
+    def dirty(self):
+        return self.dirty_all or bool(self.dirty_cells)
+
+    # ── Modification ─────────────────────────────────────────────────────────
+
+    def set_cell(self, x, y, color, alpha):
+        self.rgba[y, x] = (*color, alpha)
+        self.dirty_cells.add((x, y))
+
+    def clear_cell(self, x, y):
+        """Rend la cellule transparente ; retourne True si elle était colorée"""
+        if not self.rgba[y, x, 3]:
+            return False
+        self.rgba[y, x] = 0
+        self.dirty_cells.add((x, y))
+        return True
+
+    def set_cells(self, xs, ys, color, alpha):
+        """Colore plusieurs cellules (indices déjà dans la grille) en une opération"""
+        color = np.asarray(color)
+        alpha = np.asarray(alpha)
+        self.rgba[ys, xs, :3] = color
+        self.rgba[ys, xs, 3] = alpha
+        self.dirty_all = True
+
+    def load_surface(self, surface):
+        """Remplace toute la couche par une surface (num_cols x num_rows), ou la vide si None"""
+        if surface is None:
+            self.rgba[...] = 0
+        else:
+            self.rgba[..., :3] = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+            self.rgba[..., 3] = pygame.surfarray.pixels_alpha(surface).T
+        self.dirty_all = True
+
+    def clear(self):
+        self.rgba[...] = 0
+        self.dirty_all = True
+
+    def get_cell(self, x, y):
+        """((r, g, b), alpha) ou (None, None) si la cellule est transparente"""
+        r, g, b, a = self.rgba[y, x].tolist()
+        if a == 0:
+            return None, None
+        return (r, g, b), a
+
+    # ── Cache ────────────────────────────────────────────────────────────────
+
+    def refresh(self):
+        """
+        Met à jour la version prémultipliée.
+        Retourne None si rien n'a changé, "all" pour toute la couche, ou
+        l'ensemble des cellules (x, y) modifiées.
+        """
+        if self.dirty_all:
+            self.premultiplied[...] = premultiply(self.rgba)
+            self.dirty_all = False
+            self.dirty_cells.clear()
+            return "all"
+        if not self.dirty_cells:
+            return None
+        cells = self.dirty_cells
+        self.dirty_cells = set()
+        xs, ys = np.fromiter((x for x, _ in cells), np.intp), np.fromiter((y for _, y in cells), np.intp)
+        self.premultiplied[ys, xs] = premultiply(self.rgba[ys, xs])
+        return cells
+
+
+class LayerCompositor:
+    """
+    Superpose des OverlayLayer dans une surface prémultipliée à la résolution
+    des cellules, à afficher avec BLEND_PREMULTIPLIED.
+    """
+
+    def __init__(self, num_cols, num_rows):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.layers = {}
+        self.surface = pygame.Surface((num_cols, num_rows), pygame.SRCALPHA)
+        self.empty = True
+        self._order = []           # couches visibles, de la plus basse à la plus haute
+        self._order_dirty = True   # ordre ou visibilité changés : tout recomposer
+
+    def add_layer(self, name, z=0, visible=True):
+        layer = OverlayLayer(name, self.num_cols, self.num_rows, z, visible)
+        self.layers[name] = layer
+        self._order_dirty = True
+        return layer
+
+    def set_visible(self, name, visible):
+        layer = self.layers[name]
+        if layer.visible != visible:
+            layer.visible = visible
+            self._order_dirty = True
+
+    @property
+    def dirty(self):
+        return self._order_dirty or any(layer.dirty for layer in self.layers.values())
+
+    def update(self):
+        """
+        Recompose ce qui a changé.
+        Retourne None (rien), "all" (toute la surface) ou l'ensemble des
+        cellules modifiées, avec leur couleur : {(x, y): (r, g, b, a)}.
+        """
+        changes = [layer.refresh() for layer in self.layers.values()]
+        full = self._order_dirty or "all" in changes
+        if self._order_dirty:
+            self._order = sorted((l for l in self.layers.values() if l.visible), key=lambda l: l.z)
+            self._order_dirty = False
+
+        if full:
+            self._write_all()
+            return "all"
+
+        cells = set().union(*(c for c in changes if c))
+        if not cells:
+            return None
+        return self._write_cells(cells)
+
+    def _write_all(self):
+        out = composite_over(self._order)
+        if out is None:
+            out = np.zeros((self.num_rows, self.num_cols, 4), dtype=np.float32)
+        out = np.rint(out).astype(np.uint8)
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        pixels[...] = out[..., :3].transpose(1, 0, 2)  # surfarray est indexé [x, y]
+        del pixels
+        pixels_alpha = pygame.surfarray.pixels_alpha(self.surface)
+        pixels_alpha[...] = out[..., 3].T
+        del pixels_alpha  # libère le verrou de la surface
+        self.empty = not out[..., 3].any()
+
+    def _write_cells(self, cells):
+        cells = list(cells)
+        xs = np.fromiter((x for x, _ in cells), np.intp, len(cells))
+        ys = np.fromiter((y for _, y in cells), np.intp, len(cells))
+        out = composite_over(self._order, (ys, xs))
+        if out is None:
+            out = np.zeros((len(cells), 4), dtype=np.float32)
+        written = {}
+        for cell, rgba in zip(cells, np.rint(out).astype(np.uint8).tolist()):
+            rgba = tuple(rgba)
+            self.surface.set_at(cell, rgba)
+            written[cell] = rgba
+            self.empty = self.empty and rgba[3] == 0
+        return written
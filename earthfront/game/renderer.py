@@ -24,6 +24,7 @@ class Renderer:
         self.zoom_cache = {}
         self.current_cache_zoom = None
         self.last_camera_pos = None
+        self.last_grid_visible = None
         
         # FPS
         self.fps_update_counter = 0
@@ -49,15 +50,22 @@ class Renderer:
         # Sauvegarder l'état
         self.last_camera_pos = camera_pos
         self.current_cache_zoom = self.game.camera.zoom
+        self.last_grid_visible = self.game.grid_manager_game.visible
         self.game.need_redraw = False
     
     def _can_skip_render(self, camera_pos):
-        """Détermine si on peut sauter le rendu complet"""
+        """
+        Détermine si on peut sauter le rendu complet.
+        La grille visible n'empêche plus le saut : map_surface la contient déjà,
+        seul un overlay modifié (sélection, filtre...) impose de redessiner.
+        """
+        grid = self.game.grid_manager_game
         return (not self.game.need_redraw and
                 self.last_camera_pos == camera_pos and
                 self.current_cache_zoom == self.game.camera.zoom and
                 self.game.map_surface is not None and
-                not self.game.grid_manager_game.visible)
+                self.last_grid_visible == grid.visible and
+                not (grid.visible and grid.dirty))
     
     def _quick_render(self):
         """Rendu rapide sans recalculer la carte"""
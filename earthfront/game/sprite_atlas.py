@@ -0,0 +1,120 @@
+"""
+Atlas des icônes (ressources, bâtiments...).
+Toutes les icônes sont rangées dans une seule surface ; les cellules de la
+grille ne gardent qu'un identifiant de sprite. Pour l'affichage, l'atlas est
+réduit une fois par taille de cellule à l'écran (bande de zoom) et tous les
+sprites visibles sont dessinés en un seul Surface.blits.
+"""
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pygame
+from utils.logger import Logger
+
+logger = Logger()
+
+SPRITE_SIZE   = 64  # taille d'une icône dans l'atlas (px)
+ATLAS_COLUMNS = 16  # icônes par ligne de l'atlas
+SCALED_CACHE  = 8   # bandes de zoom gardées
+NO_SPRITE     = -1  # cellule sans icône
+
+
+class SpriteAtlas:
+    """Icônes de SPRITE_SIZE px indexées par identifiant (0, 1, 2...)"""
+
+    def __init__(self, sprite_size=SPRITE_SIZE, columns=ATLAS_COLUMNS):
+        self.sprite_size = sprite_size
+        self.columns     = columns
+        self.surface = pygame.Surface((sprite_size * columns, sprite_size), pygame.SRCALPHA)
+        self.names   = {}  # nom → identifiant
+        # surface d'origine → {alpha: identifiant} (set_cell_image) ; références
+        # faibles : l'atlas garde sa copie de l'icône, pas la surface
+        self._sources = weakref.WeakKeyDictionary()
+        self._count  = 0
+        self._scaled = OrderedDict()  # taille écran → (atlas réduit, rects)
+
+    def __len__(self):
+        return self._count
+
+    # ── Ajout d'icônes ───────────────────────────────────────────────────────
+
+    def add(self, name, image, alpha=255):
+        """
+        Ajoute une icône (Surface ou chemin d'image) sous name et retourne son
+        identifiant ; un nom déjà présent retourne l'identifiant existant.
+        """
+        if name in self.names:
+            return self.names[name]
+        if isinstance(image, str):
+            image = pygame.image.load(image).convert_alpha()
+        sprite_id = self._insert(image, alpha)
+        self.names[name] = sprite_id
+        return sprite_id
+
+    def add_surface(self, image, alpha=255):
+        """Identifiant d'une surface quelconque, ajoutée une seule fois par (surface, alpha)"""
+        by_alpha = self._sources.setdefault(image, {})
+        sprite_id = by_alpha.get(alpha)
+        if sprite_id is None:
+            sprite_id = by_alpha[alpha] = self._insert(image, alpha)
+        return sprite_id
+
+    def id_of(self, sprite):
+        """Identifiant d'un sprite donné par nom ou par identifiant"""
+        if isinstance(sprite, str):
+            return self.names[sprite]
+        if not 0 <= sprite < self._count:
+            raise KeyError(f"sprite {sprite} inconnu")
+        return sprite
+
+    def _insert(self, image, alpha):
+        sprite_id = self._count
+        row, col = divmod(sprite_id, self.columns)
+        size = self.sprite_size
+        if (row + 1) * size > self.surface.get_height():
+            grown = pygame.Surface((self.surface.get_width(), (row + 1) * size), pygame.SRCALPHA)
+            grown.blit(self.surface, (0, 0))
+            self.surface = grown
+
+        icon = pygame.transform.smoothscale(image.convert_alpha(), (size, size))
+        if alpha < 255:
+            pixels_alpha = pygame.surfarray.pixels_alpha(icon)
+            pixels_alpha[...] = (pixels_alpha.astype(np.uint16) * alpha // 255).astype(np.uint8)
+            del pixels_alpha  # libère le verrou de la surface
+        self.surface.fill((0, 0, 0, 0), (col * size, row * size, size, size))
+        self.surface.blit(icon, (col * size, row * size))
+
+        self._count += 1
+        self._scaled.clear()
+        return sprite_id
+
+    # ── Affichage ────────────────────────────────────────────────────────────
+
+    def scaled(self, size):
+        """
+        (atlas, rects) pour des icônes de size px : chaque icône est réduite
+        séparément (pas de bavure entre voisines), une fois par taille.
+        """
+        cached = self._scaled.get(size)
+        if cached is not None:
+            self._scaled.move_to_end(size)
+            return cached
+
+        rows = -(-self._count // self.columns)
+        atlas = pygame.Surface((self.columns * size, max(rows, 1) * size), pygame.SRCALPHA)
+        rects = []
+        for sprite_id in range(self._count):
+            row, col = divmod(sprite_id, self.columns)
+            src = self.surface.subsurface(
+                (col * self.sprite_size, row * self.sprite_size, self.sprite_size, self.sprite_size)
+            )
+            rect = pygame.Rect(col * size, row * size, size, size)
+            atlas.blit(pygame.transform.smoothscale(src, (size, size)), rect)
+            rects.append(rect)
+
+        cached = (atlas, rects)
+        self._scaled[size] = cached
+        if len(self._scaled) > SCALED_CACHE:
+            self._scaled.popitem(last=False)
+        logger.debug(f"Sprite atlas scaled to {size}px ({self._count} sprites)")
+        return cached
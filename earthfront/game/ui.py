@@ -111,6 +111,7 @@ class GameUI:
         self.filter_buttons = {}
         self._filter_just_clicked = None
         self._create_filter_buttons(panel_width, manager)
+        self._create_filter_entry(panel_width, manager)
         # =======================================
 
         # Bouton ressources en bas à droite
@@ -178,6 +179,40 @@ class GameUI:
             btn.rebuild()
             self.filter_buttons[key] = btn
 
+    def _create_filter_entry(self, panel_width, manager):
+        """Champ de saisie d'une expression de filtre (ex. "gold > 50 and water < 30")"""
+        margin = 10
+        start_y = 350 + len(RESOURCES) * 36 + 10  # sous les boutons filtres
+
+        self.filter_entry_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(margin, start_y, panel_width - 20, 20),
+            text="— Expression —",
+            manager=manager,
+            container=self.panel
+        )
+        self.filter_entry = pygame_gui.elements.UITextEntryLine(
+            relative_rect=pygame.Rect(margin, start_y + 22, panel_width - 20, 30),
+            manager=manager,
+            container=self.panel,
+            object_id="#filter_expression"
+        )
+        self.filter_status = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(margin, start_y + 56, panel_width - 20, 20),
+            text="",
+            manager=manager,
+            container=self.panel
+        )
+
+    def set_filter_status(self, text):
+        """Message sous le champ d'expression (erreur de syntaxe, vide sinon)"""
+        self.filter_status.set_text(text)
+
+    def clear_active_filter(self):
+        """Désactive le bouton filtre actif (remplacé par une expression)"""
+        if self.active_filter:
+            self._apply_btn_style(self.active_filter, active=False)
+            self.active_filter = None
+
     def _apply_btn_style(self, key, active):
         """Applique le style visuel d'un bouton filtre selon son état actif/inactif"""
         btn = self.filter_buttons[key]
@@ -278,6 +313,8 @@ class GameUI:
         # Reconstruire les boutons filtres (ils sont dans le panel)
         for btn in self.filter_buttons.values():
             btn.rebuild()
+        self.filter_entry.rebuild()
+        self.filter_status.rebuild()
 
         # Repositionner les boutons
         button_size = 64
@@ -0,0 +1,48 @@
+"""
+Requêtes BDD non bloquantes.
+Les lectures sont exécutées par un thread de travail et renvoient des
+futures ; la boucle de rendu n'attend jamais la BDD.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from .logger import Logger
+
+logger = Logger()
+
+QUERY_WORKERS = 1  # un seul thread : les résultats arrivent dans l'ordre des demandes
+
+
+class AsyncQueryRunner:
+    """Exécute des méthodes du DatabaseHandler dans un thread de travail"""
+
+    def __init__(self, handler, on_result=None, workers=QUERY_WORKERS):
+        """
+        handler   : DatabaseHandler dont les méthodes sont appelées
+        on_result : appelé (kind, future) dans le thread de travail à chaque
+                    requête terminée, y compris en erreur ou annulée
+        """
+        self.handler   = handler
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-query")
+
+    def submit(self, kind, method, *args):
+        """Lance handler.<method>(*args) et renvoie son future"""
+        future = self._executor.submit(getattr(self.handler, method), *args)
+        future.kind = kind
+        if self.on_result is not None:
+            future.add_done_callback(self._notify)
+        return future
+
+    def _notify(self, future):
+        try:
+            self.on_result(future.kind, future)
+        except Exception as e:
+            logger.error(f"Erreur notification requête {future.kind} : {e}")
+
+    # ── Requêtes ─────────────────────────────────────────────────────────────
+
+    def chunk_data(self, x, y):
+        return self.submit("chunk_data", "get_chunk_data", x, y)
+
+    def shutdown(self):
+        """Annule les requêtes en attente et attend celle en cours"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
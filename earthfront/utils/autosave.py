@@ -0,0 +1,84 @@
+"""
+Sauvegarde automatique en arrière-plan.
+La boucle de jeu ne fait qu'une copie instantanée de l'état entre deux
+frames ; sérialisation et écriture se font dans un thread de travail.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .data_handler import DataManager
+from .save_format import write_save
+from .logger import Logger
+
+logger = Logger()
+
+AUTOSAVE_PREFIX = "autosave_"
+
+
+class AutosaveScheduler:
+    """Déclenche une sauvegarde toutes les interval secondes, sur slots emplacements tournants"""
+
+    def __init__(self, handler, get_ledgers, interval=300.0, slots=3):
+        """
+        handler     : DatabaseHandler qui fournit la copie instantanée du monde
+        get_ledgers : fonction retournant les soldes des joueurs à sauvegarder
+        """
+        self.handler     = handler
+        self.get_ledgers = get_ledgers
+        self.interval    = interval
+        self.slots       = max(1, slots)
+        self.data_manager = DataManager()
+
+        self._next_time = time.monotonic() + interval
+        self._pending   = None  # future de l'écriture en cours
+        self._executor  = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+
+    def tick(self):
+        """
+        À appeler à chaque frame : prend la copie si c'est l'heure, sans jamais
+        attendre. Seule la copie des tableaux est faite ici ; lecture des
+        revendications, choix de l'emplacement et écriture se font dans le thread.
+        """
+        if self.interval <= 0 or time.monotonic() < self._next_time:
+            return
+        if self._pending is not None and not self._pending.done():
+            return  # écriture précédente pas terminée : on réessaie à la frame suivante
+
+        finish = self.handler.capture_snapshot(self.get_ledgers(), blocking=False)
+        if finish is None:
+            return  # écriture BDD en cours : on réessaie à la frame suivante
+
+        self._next_time = time.monotonic() + self.interval
+        try:
+            self._pending = self._executor.submit(self._write, finish)
+        except RuntimeError:  # planificateur arrêté : libère les écritures SQLite
+            finish()
+            raise
+
+    def _next_slot(self):
+        """Emplacement libre, ou le plus ancien (lit l'index des sauvegardes)"""
+        saves = self.data_manager.list_saves()
+        names = [f"{AUTOSAVE_PREFIX}{i}" for i in range(1, self.slots + 1)]
+        return min(names, key=lambda name: saves.get(name, {}).get("created", 0))
+
+    def _write(self, finish):
+        start = time.perf_counter()
+        name = "(copie)"
+        try:
+            state = finish()
+            name = self._next_slot()
+            size = write_save(self.data_manager.save_path(name), state)
+            self.data_manager.register_save(name, {
+                "kind":    "full",
+                "base":    None,
+                "created": state.created,
+                "size":    size,
+            })
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde automatique {name} : {e}")
+            return
+        logger.info(f"Sauvegarde automatique {name} ({size // 1024} Ko, "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms)")
+
+    def stop(self):
+        """Attend la fin de l'écriture en cours"""
+        self._executor.shutdown(wait=True)
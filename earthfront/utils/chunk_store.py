@@ -0,0 +1,372 @@
+"""
+Stockage du monde en mémoire, par colonnes.
+Chaque champ d'un chunk (ressources et terrains) est un tableau numpy
+(hauteur x largeur) ; les modifications sont renvoyées vers SQLite en
+différé par un thread d'écriture.
+"""
+import secrets
+import threading
+import numpy as np
+from .gen_chunk_bdd import CHUNK_COLUMNS
+from .logger import Logger
+
+logger = Logger()
+
+WRITE_BEHIND_INTERVAL = 1.0  # secondes entre deux écritures différées
+VALUE_MAX = 255  # valeurs des colonnes de chunk : 0..255 (uint8 dans le store, le mmap et les sauvegardes)
+
+
+def check_values(values):
+    """Lève ValueError si une valeur de colonne chunk sort de 0..VALUE_MAX"""
+    for name, value in values.items():
+        array = np.asarray(value)
+        if array.size and (array.min() < 0 or array.max() > VALUE_MAX):
+            raise ValueError(f"Valeur hors limites pour {name} (0..{VALUE_MAX}) : "
+                             f"{array.min() if array.min() < 0 else array.max()}")
+
+
+class ChunkView:
+    """Vue légère sur un chunk du store (lit les colonnes à la demande)"""
+
+    __slots__ = ("_store", "position")
+
+    def __init__(self, store, x, y):
+        self._store = store
+        self.position = (x, y)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)}" for name in CHUNK_COLUMNS)
+        return f"ChunkView(position={self.position}, {values})"
+
+
+def _column_property(name):
+    def getter(view):
+        x, y = view.position
+        return int(view._store.columns[name][y, x])
+    return property(getter)
+
+
+for _name in CHUNK_COLUMNS:
+    setattr(ChunkView, _name, _column_property(_name))
+
+
+class ColumnStats:
+    """
+    Statistiques d'une colonne, tenues à jour à chaque écriture :
+    histogramme des 256 valeurs possibles, total, nombre de chunks non nuls, maximum.
+    """
+
+    __slots__ = ("histogram", "total", "nonzero", "maximum")
+
+    def __init__(self):
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self.total   = 0
+        self.nonzero = 0
+        self.maximum = 0
+
+    def add_many(self, values, sign=1):
+        """Ajoute (ou retire si sign=-1) un tableau de valeurs"""
+        self.histogram += sign * np.bincount(values, minlength=256)
+        self.total   = int(self.histogram @ np.arange(256))
+        self.nonzero = int(self.histogram[1:].sum())
+        self._refresh_maximum()
+
+    def replace(self, old, new):
+        """Remplace une valeur old par new (old=None : nouveau chunk)"""
+        if old is not None:
+            self.histogram[old] -= 1
+            self.total   -= old
+            self.nonzero -= old > 0
+        self.histogram[new] += 1
+        self.total   += new
+        self.nonzero += new > 0
+
+        if new > self.maximum:
+            self.maximum = new
+        elif old == self.maximum and self.histogram[old] == 0:
+            self._refresh_maximum()
+
+    def _refresh_maximum(self):
+        used = np.flatnonzero(self.histogram[1:])
+        self.maximum = int(used[-1]) + 1 if len(used) else 0
+
+    def as_dict(self):
+        return {
+            "total":     self.total,
+            "max":       self.maximum,
+            "nonzero":   self.nonzero,
+            "histogram": self.histogram.copy(),
+        }
+
+
+class ChunkStore:
+    """Monde entier en mémoire : une colonne uint8 par champ + un masque de présence"""
+
+    def __init__(self, width, height):
+        self.width  = width
+        self.height = height
+        self.columns, self.present = self._allocate()
+        self.chunk_count = 0
+
+        # Statistiques par colonne, protégées par _stats_lock (construites au premier usage)
+        self._stats = None
+        self._stats_lock = threading.Lock()
+
+        # Époque de dernière modification de chaque chunk (pour les sauvegardes delta),
+        # session : identifie ces époques, qui repartent de 0 à chaque ouverture
+        self.epoch    = 0
+        self.versions = np.zeros((height, width), dtype=np.uint32)
+        self.session  = secrets.randbits(63)
+
+        # Chunks modifiés en mémoire, pas encore écrits dans SQLite
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+
+    def _allocate(self):
+        """Tableaux des colonnes et masque de présence (hauteur x largeur)"""
+        columns = {name: np.zeros((self.height, self.width), dtype=np.uint8) for name in CHUNK_COLUMNS}
+        return columns, np.zeros((self.height, self.width), dtype=bool)
+
+    def _column_stats(self):
+        """Statistiques par colonne (à appeler avec _stats_lock) ; construites au besoin"""
+        if self._stats is None:
+            self._stats = {name: ColumnStats() for name in CHUNK_COLUMNS}
+            present = self.present
+            for name in CHUNK_COLUMNS:
+                self._stats[name].add_many(self.columns[name][present])
+            self.chunk_count = int(present.sum())
+        return self._stats
+
+    @property
+    def nbytes(self):
+        return sum(col.nbytes for col in self.columns.values()) + self.present.nbytes
+
+    # ── Écriture ─────────────────────────────────────────────────────────────
+
+    def load_rows(self, rows, missing_only=False):
+        """
+        Charge des lignes (x, y, *CHUNK_COLUMNS) déjà présentes dans la BDD.
+        missing_only : ignore les chunks déjà présents dans le store (chunks générés).
+        """
+        if not rows:
+            return
+        data = np.asarray(rows, dtype=np.int64)
+        check_values({"chunk": data[:, 2:]})
+        xs, ys = data[:, 0], data[:, 1]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs, ys, data = xs[inside], ys[inside], data[inside]
+
+        with self._stats_lock:
+            if missing_only:
+                new = ~self.present[ys, xs]
+                xs, ys, data = xs[new], ys[new], data[new]
+                if not len(xs):
+                    return
+            all_stats = self._column_stats()
+            known = self.present[ys, xs]
+            for i, name in enumerate(CHUNK_COLUMNS, start=2):
+                column, stats = self.columns[name], all_stats[name]
+                if known.any():
+                    stats.add_many(column[ys[known], xs[known]], sign=-1)
+                column[ys, xs] = data[:, i]
+                stats.add_many(column[ys, xs])
+            self.present[ys, xs] = True
+            self.chunk_count += int(len(xs) - known.sum())
+            self._touch(xs, ys)
+
+    def put(self, chunk_data):
+        """Enregistre un chunk complet (ChunkData) et le marque à écrire"""
+        x, y = chunk_data.position
+        self.update(x, y, **{name: getattr(chunk_data, name) for name in CHUNK_COLUMNS})
+
+    def update(self, x, y, **values):
+        """Modifie des champs d'un chunk et le marque à écrire"""
+        check_values(values)  # avant toute modification : colonnes et stats restent cohérentes
+        with self._stats_lock:
+            all_stats = self._column_stats()
+            known = bool(self.present[y, x])
+            for name, value in values.items():
+                column = self.columns[name]
+                all_stats[name].replace(int(column[y, x]) if known else None, int(value))
+                column[y, x] = value
+            if not known:
+                # Colonnes non fournies : le nouveau chunk y vaut 0
+                for name in CHUNK_COLUMNS:
+                    if name not in values:
+                        all_stats[name].replace(None, 0)
+                self.present[y, x] = True
+                self.chunk_count += 1
+            self._touch(x, y)
+        with self._dirty_lock:
+            self._dirty.add((x, y))
+
+    def update_many(self, xs, ys, **values):
+        """
+        Modifie des champs d'un ensemble de chunks et les marque à écrire.
+        Chaque valeur est un scalaire ou un tableau aligné sur xs / ys ; pour une
+        position répétée, la dernière occurrence l'emporte. Les positions hors du
+        monde sont ignorées.
+        """
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        values = {name: np.broadcast_to(np.asarray(value), xs.shape) for name, value in values.items()}
+        check_values(values)
+
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if not inside.all():
+            xs, ys = xs[inside], ys[inside]
+            values = {name: value[inside] for name, value in values.items()}
+        if not len(xs):
+            return
+
+        # Dernière occurrence de chaque position (les stats comptent chaque chunk une fois)
+        _, first_from_end = np.unique((ys * self.width + xs)[::-1], return_index=True)
+        keep = len(xs) - 1 - first_from_end
+        xs, ys = xs[keep], ys[keep]
+
+        with self._stats_lock:
+            all_stats = self._column_stats()
+            known = self.present[ys, xs]
+            added = int(len(xs) - known.sum())
+            for name, value in values.items():
+                column, stats = self.columns[name], all_stats[name]
+                stats.add_many(column[ys[known], xs[known]], sign=-1)
+                column[ys, xs] = value[keep]
+                stats.add_many(column[ys, xs])
+            if added:
+                # Colonnes non fournies : les nouveaux chunks y valent 0
+                for name in CHUNK_COLUMNS:
+                    if name not in values:
+                        all_stats[name].add_many(np.zeros(added, dtype=np.uint8))
+                self.present[ys, xs] = True
+                self.chunk_count += added
+            self._touch(xs, ys)
+        self.mark_dirty(zip(xs.tolist(), ys.tolist()))
+
+    def touch(self, xs, ys):
+        """Marque des chunks modifiés hors du store (propriétaire, bâtiment...)"""
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        with self._stats_lock:
+            self._touch(xs[inside], ys[inside])
+
+    def _touch(self, xs, ys):
+        """À appeler avec _stats_lock"""
+        self.epoch += 1
+        self.versions[ys, xs] = self.epoch
+
+    def replace_all(self, columns, present):
+        """Remplace tout le contenu (chargement d'une sauvegarde) ; tout est à écrire"""
+        with self._stats_lock:
+            for name in CHUNK_COLUMNS:
+                self.columns[name][...] = columns[name]
+            self.present[...] = present
+            self._stats = None
+            self._column_stats()
+            self.epoch += 1
+            self.versions[...] = self.epoch
+        ys, xs = np.nonzero(self.present)
+        self.mark_dirty(zip(xs.tolist(), ys.tolist()))
+
+    def mark_dirty(self, positions):
+        """Marque des chunks (x, y) à écrire"""
+        with self._dirty_lock:
+            self._dirty.update(positions)
+
+    def take_dirty_rows(self):
+        """Retire les chunks modifiés et renvoie leurs lignes (x, y, *CHUNK_COLUMNS)"""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return []
+        xs, ys = np.array(list(dirty), dtype=np.int64).T
+        values = [self.columns[name][ys, xs] for name in CHUNK_COLUMNS]
+        return np.column_stack([xs, ys, *values]).tolist()
+
+    # ── Lecture ──────────────────────────────────────────────────────────────
+
+    def get(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height) or not self.present[y, x]:
+            return None
+        return ChunkView(self, x, y)
+
+    def region(self, x0, y0, x1, y1, columns=CHUNK_COLUMNS):
+        """
+        Colonnes du rectangle [x0, x1] x [y0, y1] (bornes incluses), tableaux
+        (y1 - y0 + 1, x1 - x0 + 1) ; les cases hors du monde valent 0 et ne
+        sont pas dans le masque "present".
+        """
+        shape = (max(y1 - y0 + 1, 0), max(x1 - x0 + 1, 0))
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x1 + 1, self.width), min(y1 + 1, self.height)
+
+        if (cx0, cy0, cx1 - x0, cy1 - y0) == (x0, y0) + shape[::-1]:
+            # Rectangle entièrement dans le monde : simples copies de tranches
+            out = {name: self.columns[name][y0:y1 + 1, x0:x1 + 1].copy() for name in columns}
+            out["present"] = self.present[y0:y1 + 1, x0:x1 + 1].copy()
+            return out
+
+        out = {name: np.zeros(shape, dtype=np.uint8) for name in columns}
+        out["present"] = np.zeros(shape, dtype=bool)
+        if cx0 < cx1 and cy0 < cy1:
+            inner = (slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0))
+            for name in columns:
+                out[name][inner] = self.columns[name][cy0:cy1, cx0:cx1]
+            out["present"][inner] = self.present[cy0:cy1, cx0:cx1]
+        return out
+
+    def snapshot(self):
+        """
+        Copie instantanée (cohérente) du store : (colonnes (n_colonnes, h, l),
+        présence, époques de modification, époque courante).
+        """
+        with self._stats_lock:
+            columns = np.stack([self.columns[name] for name in CHUNK_COLUMNS])
+            return columns, self.present.copy(), self.versions.copy(), self.epoch
+
+    def stats(self, name):
+        """Statistiques de la colonne (total, max, nonzero, histogram), en O(1)"""
+        with self._stats_lock:
+            return self._column_stats()[name].as_dict()
+
+    def close(self):
+        """Libère le store (rien à faire en mémoire)"""
+
+    def world_info(self):
+        with self._stats_lock:
+            all_stats = self._column_stats()
+            return {
+                "chunk_count": self.chunk_count,
+                "total_gold":  all_stats["gold"].total,
+                "total_iron":  all_stats["iron"].total,
+                "total_oil":   all_stats["oil"].total,
+            }
+
+
+class WriteBehindWriter:
+    """Thread qui écrit périodiquement les modifications en attente dans SQLite"""
+
+    def __init__(self, handler, interval=WRITE_BEHIND_INTERVAL):
+        """handler : DatabaseHandler dont flush() écrit les chunks modifiés"""
+        self.handler  = handler
+        self.interval = interval
+        self._stop    = threading.Event()
+        self._thread  = threading.Thread(target=self._run, name="chunk-write-behind", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread après une dernière écriture"""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                if not self.handler.in_batch:  # un lot ouvert est écrit d'un bloc à sa fin
+                    self.handler.flush()
+            self.handler.flush()
+        finally:
+            self.handler.release_connection()
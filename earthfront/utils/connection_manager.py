@@ -0,0 +1,119 @@
+"""
+Gestion des connexions SQLite partagées entre threads.
+Chaque thread reçoit sa propre connexion ; la BDD est en mode WAL pour que
+les lecteurs ne soient jamais bloqués par l'écrivain (génération, sauvegarde).
+"""
+import sqlite3
+import threading
+import time
+from .logger import Logger
+
+logger = Logger()
+
+IDLE_TIMEOUT   = 60.0  # secondes sans utilisation avant fermeture d'une connexion
+REAP_INTERVAL  = 5.0   # secondes entre deux recherches de connexions inactives
+BUSY_TIMEOUT   = 5.0   # attente max (s) d'un verrou d'écriture
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # sûr en WAL, un seul fsync par checkpoint
+)
+
+
+class _Entry:
+    __slots__ = ("thread", "conn", "cursor", "last_used", "closed")
+
+    def __init__(self, thread, conn):
+        self.thread    = thread
+        self.conn      = conn
+        self.cursor    = conn.cursor()
+        self.last_used = time.monotonic()
+        self.closed    = False
+
+
+class ConnectionManager:
+    """
+    Une connexion SQLite par thread.
+    Un thread doit reprendre sa connexion via get() à chaque utilisation :
+    une connexion non reprise depuis idle_timeout secondes (hors transaction),
+    ou dont le thread est terminé, est fermée.
+    """
+
+    def __init__(self, db_name, idle_timeout=IDLE_TIMEOUT):
+        self.db_name = db_name
+        self.idle_timeout = idle_timeout
+        self._local = threading.local()
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_reap = time.monotonic()
+
+    # ── API publique ─────────────────────────────────────────────────────────
+
+    def get(self):
+        """Connexion du thread courant (ouverte si besoin)"""
+        return self._entry().conn
+
+    def cursor(self):
+        """Curseur réutilisable de la connexion du thread courant"""
+        return self._entry().cursor
+
+    def release(self):
+        """Ferme la connexion du thread courant"""
+        entry = getattr(self._local, "entry", None)
+        if entry is not None:
+            with self._lock:
+                self._close(entry)
+            self._local.entry = None
+
+    def close_idle(self):
+        """Ferme les connexions inactives ou dont le thread est terminé"""
+        now = time.monotonic()
+        current = threading.current_thread()
+        with self._lock:
+            self._last_reap = now
+            for entry in list(self._entries.values()):
+                if entry.thread is current:
+                    continue
+                dead = not entry.thread.is_alive()
+                idle = now - entry.last_used > self.idle_timeout and not entry.conn.in_transaction
+                if dead or idle:
+                    self._close(entry)
+
+    def close_all(self):
+        """Ferme toutes les connexions (les autres threads doivent être arrêtés)"""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._close(entry)
+        self._local.entry = None
+
+    # ── Interne ──────────────────────────────────────────────────────────────
+
+    def _entry(self):
+        if time.monotonic() - self._last_reap > REAP_INTERVAL:
+            self.close_idle()
+
+        entry = getattr(self._local, "entry", None)
+        with self._lock:
+            if entry is not None and not entry.closed:
+                entry.last_used = time.monotonic()
+                return entry
+
+            # check_same_thread=False : seule la fermeture peut venir d'un autre thread
+            conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            entry = _Entry(threading.current_thread(), conn)
+            self._entries[id(entry)] = entry
+        self._local.entry = entry
+        return entry
+
+    def _close(self, entry):
+        """À appeler avec self._lock"""
+        if entry.closed:
+            return
+        try:
+            entry.conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Erreur fermeture connexion ({entry.thread.name}) : {e}")
+        entry.closed = True
+        self._entries.pop(id(entry), None)
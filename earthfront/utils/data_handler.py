@@ -1,13 +1,18 @@
 import json
 import os.path
+import threading
 from pathlib import Path
 from typing import  Optional
 import dataclasses
 from utils.color_converter import rgb_to_hex, hex_to_rgb
 from path import PATH
 from utils.logger import Logger
+from utils.save_format import SAVE_EXTENSION
 logger = Logger()
 
+# saves.json est aussi mis à jour par le thread de sauvegarde automatique
+_saves_lock = threading.Lock()
+
 @dataclasses.dataclass
 class Config:
     window_width: int = 1280
@@ -18,6 +23,14 @@ class Config:
     show_fps: bool = True
     fps: int = 60
     full_screen: bool = False
+    generation_workers: int = 1  # 1 = génération série, 0 = un processus par cœur (grands mondes)
+    lazy_generation: bool = True  # génère le monde à la demande autour de la caméra
+    world_seed: int = 55
+    world_cache_max_mb: int = 512  # budget disque des mondes gardés en cache
+    chunk_backend: str = "sqlite"  # "sqlite" (chargé en mémoire) ou "mmap" (fichier projeté)
+    db_flush_interval: float = 1.0  # secondes entre deux écritures des chunks modifiés
+    autosave_interval: float = 300.0  # secondes entre deux sauvegardes automatiques (0 = désactivé)
+    autosave_slots: int = 3  # emplacements autosave_1..N réutilisés à tour de rôle
 
     def to_dict(self):
         return dataclasses.asdict(self)
@@ -106,7 +119,8 @@ class DataManager:
         self.base = Path(os.path.join(PATH, "data/"))
         self.config = self.base / "config.json"
         self.theme = self.base / "theme.json"
-        self.saves = self.base / "saves.json"
+        self.saves = self.base / "saves.json"  # index des sauvegardes
+        self.saves_dir = self.base / "saves"
 
         self.check_file_exists()
 
@@ -200,5 +214,36 @@ class DataManager:
             theme.update(data=data)
             return theme
 
+    ########################
+    ######## SAVES #########
+    ########################
+
+    def save_path(self, name):
+        """Fichier binaire d'une sauvegarde"""
+        self.saves_dir.mkdir(parents=True, exist_ok=True)
+        return self.saves_dir / f"{name}{SAVE_EXTENSION}"
+
+    def list_saves(self):
+        """Index des sauvegardes : {nom: {kind, base, created, size}}"""
+        try:
+            with open(self.saves, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading saves index: {e}")
+            return {}
+
+    def get_save(self, name):
+        return self.list_saves().get(name)
+
+    def register_save(self, name, info):
+        logger.info(f"Registering save {name}...")
+        with _saves_lock:
+            saves = self.list_saves()
+            saves[name] = info
+            temp = self.saves.with_suffix(".json.tmp")
+            with open(temp, "w") as f:
+                json.dump(saves, f)
+            os.replace(temp, self.saves)
+
 if __name__ == "__main__":
     DataManager().save_default_theme()
\ No newline at end of file
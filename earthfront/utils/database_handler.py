@@ -1,124 +1,625 @@
+import multiprocessing
 import sqlite3
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from .models import ChunkData
 from .logger import Logger
-from .gen_chunk_bdd import ChunkDataExtractor
+from .gen_chunk_bdd import (ChunkDataExtractor, split_bands, init_band_worker, generate_band,
+                            build_world_manifest, RESOURCE_COLUMNS, CHUNK_COLUMNS)
+from .world_streamer import LazyWorldGenerator
+from .chunk_store import ChunkStore, WriteBehindWriter, WRITE_BEHIND_INTERVAL, check_values
+from .connection_manager import ConnectionManager
+from .mmap_store import MmapChunkStore, MMAP_SUFFIX
+from .save_format import SaveState, NO_BUILD
+from .filter_expr import compile_filter
 
 logger = Logger()
 
+# En dessous, le démarrage des processus (spawn + import de numpy) coûte plus
+# que la génération série (~1.5 µs par chunk, 20 ms pour 150x90 chunks)
+POOL_MIN_CHUNKS = 1_000_000
+
+# Chunks indexés par coordonnées entières ; WITHOUT ROWID : la table est
+# directement rangée selon (x, y), les index ressources contiennent donc (x, y)
+CREATE_CHUNK_SQL = """
+    CREATE TABLE IF NOT EXISTS chunk (
+        x      INTEGER NOT NULL,
+        y      INTEGER NOT NULL,
+        oil    INTEGER,
+        gold   INTEGER,
+        iron   INTEGER,
+        copper INTEGER,
+        coal   INTEGER,
+        water  INTEGER,
+        wood   INTEGER,
+        grass  INTEGER,
+        snow   INTEGER,
+        sand   INTEGER,
+        owner  TEXT,
+        build  INTEGER,
+        PRIMARY KEY (x, y)
+    ) WITHOUT ROWID
+"""
+
+# Tampon d'écriture du monde : jeton tiré à la création de la BDD et compteur
+# incrémenté dans chaque transaction qui écrit la table chunk, quel que soit le
+# backend (store, SQLite direct, génération). Le fichier mmap garde le tampon
+# lu à sa fermeture : s'il diffère à l'ouverture, il est reconstruit.
+CREATE_WORLD_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS world_state (
+        key   TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+"""
+BUMP_WRITE_SEQ_SQL = "UPDATE world_state SET value = value + 1 WHERE key = 'write_seq'"
+
+# Upsert : les colonnes hors CHUNK_COLUMNS (owner, build) sont conservées
+INSERT_CHUNK_SQL = f"""
+    INSERT INTO chunk (x, y, {", ".join(CHUNK_COLUMNS)})
+    VALUES (?, ?, {", ".join("?" for _ in CHUNK_COLUMNS)})
+    ON CONFLICT (x, y) DO UPDATE SET
+    {", ".join(f"{name} = excluded.{name}" for name in CHUNK_COLUMNS)}
+"""
+
+# Chunks générés : n'écrasent jamais un chunk déjà présent (modifié ou restauré entre-temps)
+GENERATED_CHUNK_SQL = f"""
+    INSERT INTO chunk (x, y, {", ".join(CHUNK_COLUMNS)})
+    VALUES (?, ?, {", ".join("?" for _ in CHUNK_COLUMNS)})
+    ON CONFLICT (x, y) DO NOTHING
+"""
+
+# Colonnes présentes seulement dans SQLite (pas dans le store)
+SQL_ONLY_COLUMNS = ("owner", "build")
+WRITABLE_COLUMNS = CHUNK_COLUMNS + SQL_ONLY_COLUMNS
+
+
+CLAIMED_WHERE = "owner IS NOT NULL OR build IS NOT NULL"
+
+# Requêtes par ressource, écrites une fois pour toutes : aucun nom venant de
+# l'appelant n'est inséré dans du SQL (une ressource inconnue n'a pas d'entrée)
+RESOURCE_HISTOGRAM_SQL = {
+    name: f"SELECT {name}, COUNT(*) FROM chunk GROUP BY {name}" for name in RESOURCE_COLUMNS
+}
+
+
+def partial_upsert_sql(names):
+    """Upsert ne touchant que les colonnes names (les autres sont conservées)"""
+    return f"""
+        INSERT INTO chunk (x, y, {", ".join(names)})
+        VALUES (?, ?, {", ".join("?" for _ in names)})
+        ON CONFLICT (x, y) DO UPDATE SET
+        {", ".join(f"{name} = excluded.{name}" for name in names)}
+    """
+
+
+# PRAGMAs de la connexion de génération : on privilégie le débit (aucun fsync).
+# Le WAL garde la BDD cohérente si le jeu est tué en cours de génération,
+# ce qui permet de reprendre à la dernière bande validée.
+GENERATION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",  # 64 Mo
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Stockage des chunks une fois le monde ouvert (voir load_store)
+CHUNK_BACKENDS = ("sqlite", "mmap")
+
+COMMIT_EVERY_BANDS = 8    # bandes insérées par transaction
+PROGRESS_INTERVAL  = 0.05  # secondes entre deux appels à on_progress
+
 
 class DatabaseHandler:
-    def __init__(self, game, db_name="data/chunk_base.db"):
+    def __init__(self, game, db_name, backend="sqlite",
+                 flush_interval=WRITE_BEHIND_INTERVAL):
+        """
+        backend        : "sqlite" (store chargé en mémoire depuis SQLite à l'ouverture)
+                         ou "mmap" (store projeté depuis un fichier d'enregistrements fixes)
+        flush_interval : secondes entre deux écritures des chunks modifiés (store chargé)
+        """
+        if backend not in CHUNK_BACKENDS:
+            raise ValueError(f"Backend inconnu : {backend}")
         self.game = game
         self.db_name = db_name
-        self.conn = sqlite3.connect(self.db_name)
-        self.cur = self.conn.cursor()
+        self.backend = backend
+        self.mmap_path = db_name + MMAP_SUFFIX
+        self.flush_interval = flush_interval
+        self.connections = ConnectionManager(self.db_name)
+        self.lazy_generator = None
+        self.store = None
+        self._write_behind = None
+
+        # Modifications en attente des colonnes SQLite : {(x, y): {colonne: valeur}}
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._batch_depth = 0
+        self._batch_lock = threading.Lock()
+
         self._create_table()
 
+    @property
+    def conn(self):
+        """Connexion du thread courant"""
+        return self.connections.get()
+
+    @property
+    def cur(self):
+        """Curseur de la connexion du thread courant"""
+        return self.connections.cursor()
+
     def _create_table(self):
-        """Crée la table chunks si elle n'existe pas"""
+        """Crée la table chunks si elle n'existe pas (et migre l'ancien schéma)"""
         try:
+            self._migrate_legacy_schema()
+            self.cur.execute(CREATE_CHUNK_SQL)
+            self._add_missing_columns()
+            # Index couvrants pour les requêtes par ressource (ex. filtres)
+            for resource in RESOURCE_COLUMNS:
+                self.cur.execute(f"CREATE INDEX IF NOT EXISTS idx_chunk_{resource} ON chunk ({resource})")
+            # Index partiel des chunks revendiqués ou construits (lus par les sauvegardes)
+            self.cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_chunk_claimed ON chunk (x, y, owner, build)
+                WHERE {CLAIMED_WHERE}
+            """)
+
+            # Manifeste du monde et bandes de colonnes déjà générées
+            self.cur.execute("""
+                CREATE TABLE IF NOT EXISTS world_manifest (
+                    key   TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
             self.cur.execute("""
-                CREATE TABLE IF NOT EXISTS chunk (
-                    position TEXT PRIMARY KEY,
-                    oil      INTEGER,
-                    gold     INTEGER,
-                    iron     INTEGER,
-                    copper   INTEGER,
-                    coal     INTEGER,
-                    water    INTEGER,
-                    wood     INTEGER
+                CREATE TABLE IF NOT EXISTS world_band (
+                    x0 INTEGER PRIMARY KEY,
+                    x1 INTEGER NOT NULL
                 )
             """)
+            self.cur.execute(CREATE_WORLD_STATE_SQL)
+            self.cur.execute("""
+                INSERT OR IGNORE INTO world_state (key, value)
+                VALUES ('token', random()), ('write_seq', 0)
+            """)
             self.conn.commit()
             logger.info("Table 'chunk' créée ou déjà existante")
         except Exception as e:
             logger.error(f"Erreur création table : {e}")
 
-    def generate_world(self, seed, width, height, on_progress=None):
-        logger.info(f"Génération du monde (seed={seed}, taille={width}x{height})...")
+    def _migrate_legacy_schema(self):
+        """
+        Convertit une table chunk indexée par texte ("x;y") vers le schéma
+        à clé entière (x, y). Les colonnes communes aux deux schémas sont conservées.
+        """
+        self.cur.execute("PRAGMA table_info(chunk)")
+        legacy_columns = [row[1] for row in self.cur.fetchall()]
+        if "position" not in legacy_columns:
+            return
 
-        # Nouvelle connexion propre pour ce thread
-        conn = sqlite3.connect(self.db_name)
+        logger.info("Ancien schéma 'chunk' détecté — migration vers des coordonnées entières")
+        self.cur.execute("BEGIN")
+        try:
+            self.cur.execute("ALTER TABLE chunk RENAME TO chunk_legacy")
+            self.cur.execute(CREATE_CHUNK_SQL)
+            self.cur.execute("PRAGMA table_info(chunk)")
+            kept = [row[1] for row in self.cur.fetchall() if row[1] in legacy_columns]
+            self.cur.execute(f"""
+                INSERT OR REPLACE INTO chunk (x, y, {", ".join(kept)})
+                SELECT CAST(substr(position, 1, instr(position, ';') - 1) AS INTEGER),
+                       CAST(substr(position, instr(position, ';') + 1) AS INTEGER),
+                       {", ".join(kept)}
+                FROM chunk_legacy
+                WHERE instr(position, ';') > 0
+            """)
+            migrated = self.cur.rowcount
+            self.cur.execute("DROP TABLE chunk_legacy")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        logger.info(f"Migration terminée ({migrated} chunks)")
+
+    def _add_missing_columns(self):
+        """Ajoute à une table chunk existante les colonnes apparues depuis sa création"""
+        self.cur.execute("PRAGMA table_info(chunk)")
+        existing = {row[1] for row in self.cur.fetchall()}
+        for name in CHUNK_COLUMNS:
+            if name not in existing:
+                self.cur.execute(f"ALTER TABLE chunk ADD COLUMN {name} INTEGER")
+                logger.info(f"Colonne '{name}' ajoutée à la table chunk")
+
+    # ── Manifeste du monde ───────────────────────────────────────────────────
+
+    @staticmethod
+    def _read_manifest(cur):
+        cur.execute("SELECT key, value FROM world_manifest")
+        return dict(cur.fetchall())
+
+    @staticmethod
+    def _read_completed_bands(cur):
+        cur.execute("SELECT x0, x1 FROM world_band")
+        return set(cur.fetchall())
+
+    def get_manifest(self):
+        """Manifeste du monde stocké dans la BDD ({} si aucun)"""
+        return self._read_manifest(self.cur)
+
+    def get_write_stamp(self):
+        """(jeton, compteur d'écritures) des colonnes de chunk de cette BDD"""
+        self.cur.execute("SELECT key, value FROM world_state")
+        state = dict(self.cur.fetchall())
+        return state["token"], state["write_seq"]
+
+    def get_world_status(self, manifest):
+        """
+        Compare la BDD au manifeste attendu :
+        'complete' (rien à générer), 'partial' (reprise possible) ou 'invalid'.
+        """
+        if self.get_manifest() != manifest:
+            return "invalid"
+        bands = set(split_bands(int(manifest["width"]), int(manifest["band_width"])))
+        if bands <= self._read_completed_bands(self.cur):
+            return "complete"
+        return "partial"
+
+    def _prepare_world(self, conn, manifest):
+        """
+        Vide le monde si la BDD ne porte pas ce manifeste.
+        Retourne les bandes déjà validées.
+        """
         cur = conn.cursor()
+        if self._read_manifest(cur) != manifest:
+            logger.info("Manifeste différent — le monde est régénéré entièrement")
+            cur.execute("DELETE FROM chunk")
+            cur.execute("DELETE FROM world_band")
+            cur.execute(BUMP_WRITE_SEQ_SQL)
+            cur.execute("DELETE FROM world_manifest")
+            cur.executemany("INSERT INTO world_manifest (key, value) VALUES (?, ?)", manifest.items())
+            conn.commit()
+        return self._read_completed_bands(cur)
 
-        cur.execute("DELETE FROM chunk")
-        conn.commit()
-        logger.info("Table chunk vidée")
+    # ── Génération ───────────────────────────────────────────────────────────
+
+    def open_connection(self):
+        """Connexion du thread courant (à reprendre à chaque utilisation)"""
+        return self.connections.get()
+
+    def open_generation_connection(self):
+        """Connexion du thread courant, configurée pour l'écriture de chunks générés"""
+        conn = self.connections.get()
+        for pragma in GENERATION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def release_connection(self):
+        """Ferme la connexion du thread courant (fin d'un thread de travail)"""
+        self.connections.release()
+
+    def generate_world(self, seed, width, height, on_progress=None, workers=1, manifest=None):
+        """
+        Génère les chunks du monde manquants.
+        Si la BDD porte déjà ce manifeste, seules les bandes non validées sont
+        générées (reprise) ; sinon le monde est vidé puis régénéré en entier.
+        workers > 1 : au-delà de POOL_MIN_CHUNKS chunks à générer, les bandes de
+        colonnes sont calculées par un pool de processus,
+        les résultats reviennent dans l'ordre série vers un unique écrivain SQLite
+        (la BDD obtenue est identique à celle du mode série pour une même seed).
+        """
+        if manifest is None:
+            manifest = build_world_manifest(seed, width, height)
+
+        # Connexion propre à ce thread
+        conn = self.open_generation_connection()
+
+        done  = self._prepare_world(conn, manifest)
+        todo  = [band for band in split_bands(width) if band not in done]
+        already = sum((x1 - x0) * height for x0, x1 in done)
+        logger.info(f"Génération du monde (seed={seed}, taille={width}x{height}, workers={workers}, "
+                    f"{len(todo)} bandes à générer, {already} chunks déjà présents)...")
 
         extractor = ChunkDataExtractor(seed=seed)
-        chunk_count = 0
-
-        for x in range(width):
-            for y in range(height):
-                chunk_data = extractor.get_chunk_data(x, y)
-                position_str = f"{chunk_data.position[0]};{chunk_data.position[1]}"
-                cur.execute("""
-                    INSERT OR REPLACE INTO chunk
-                    (position, oil, gold, iron, copper, coal, water, wood)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (position_str, chunk_data.oil, chunk_data.gold, chunk_data.iron,
-                      chunk_data.copper, chunk_data.coal, chunk_data.water, chunk_data.wood))
-                chunk_count += 1
-
-                if chunk_count % 100 == 0:  # commit toutes les 50 insertions (plus rapide)
-                    conn.commit()
+        bands = [(x0, x1, height) for x0, x1 in todo]
 
-                if on_progress is not None:
-                    on_progress(chunk_count)
+        executor = None
+        if workers > 1 and len(bands) > 1 and len(bands) * height >= POOL_MIN_CHUNKS:
+            # spawn : pas de fork d'un processus qui fait tourner pygame et des threads
+            executor = ProcessPoolExecutor(
+                max_workers=min(workers, len(bands)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_band_worker,
+                initargs=(seed, extractor.terrain_counts),
+            )
+            band_results = executor.map(generate_band, bands)
+        else:
+            band_results = (extractor.get_band_rows(*band) for band in bands)
 
-        conn.commit()  # commit final
-        conn.close()
+        try:
+            chunk_count = self.ingest_chunks(conn, zip(todo, band_results), on_progress, already)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            self.release_connection()
 
         logger.info(f"✅ {chunk_count} chunks générés et insérés !")
         return chunk_count
 
-    def insert_chunk(self, chunk_data: ChunkData) -> bool:
-        """Insère un chunk dans la BDD"""
+    @staticmethod
+    def ingest_chunks(conn, bands, on_progress=None, count=0,
+                      commit_every=COMMIT_EVERY_BANDS, progress_interval=PROGRESS_INTERVAL):
+        """
+        Insère un flux de bandes ((x0, x1), lignes chunk) par executemany.
+        Comme write_generated_rows, les chunks déjà présents (modifiés pendant
+        une session paresseuse interrompue) sont gardés.
+        Chaque bande est marquée comme validée dans world_band dans la même
+        transaction que ses chunks ; une transaction couvre commit_every bandes.
+        on_progress(nb_chunks) est appelé au plus une fois par progress_interval
+        secondes, puis une dernière fois à la fin.
+        """
+        last_report = time.monotonic()
+        pending = 0
         try:
-            query = """
-                INSERT OR REPLACE INTO chunk
-                (position, oil, gold, iron, copper, coal, water, wood)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            position_str = f"{chunk_data.position[0]};{chunk_data.position[1]}"
-            self.cur.execute(query, (
-                position_str,
-                chunk_data.oil,
-                chunk_data.gold,
-                chunk_data.iron,
-                chunk_data.copper,
-                chunk_data.coal,
-                chunk_data.water,
-                chunk_data.wood,
-            ))
-            self.conn.commit()
+            for (x0, x1), rows in bands:
+                conn.executemany(GENERATED_CHUNK_SQL, rows)
+                conn.execute("INSERT OR REPLACE INTO world_band (x0, x1) VALUES (?, ?)", (x0, x1))
+                conn.execute(BUMP_WRITE_SEQ_SQL)
+                count += len(rows)
+                pending += 1
+
+                if pending >= commit_every:
+                    conn.commit()
+                    pending = 0
+
+                now = time.monotonic()
+                if on_progress is not None and now - last_report >= progress_interval:
+                    on_progress(count)
+                    last_report = now
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if on_progress is not None:
+            on_progress(count)
+        return count
+
+    def write_generated_rows(self, conn, rows, band_done=None):
+        """
+        Écrit des lignes chunk générées ; band_done marque une bande comme validée.
+        Les chunks déjà présents (modifiés ou restaurés pendant la génération) sont gardés.
+        """
+        conn.executemany(GENERATED_CHUNK_SQL, rows)
+        conn.execute(BUMP_WRITE_SEQ_SQL)
+        if band_done is not None:
+            conn.execute("INSERT OR REPLACE INTO world_band (x0, x1) VALUES (?, ?)", band_done)
+        conn.commit()
+        if self.store is not None:
+            self.store.load_rows(rows, missing_only=True)
+
+    # ── Génération paresseuse ────────────────────────────────────────────────
+
+    def start_lazy_generation(self, seed, width, height, manifest):
+        """
+        Démarre la génération à la demande : le jeu peut s'afficher tout de suite,
+        les chunks manquants sont générés en fond (zone visible d'abord) ou à la volée
+        lors d'une lecture.
+        """
+        conn = self.open_generation_connection()
+        try:
+            done = self._prepare_world(conn, manifest)
+        finally:
+            self.release_connection()
+
+        # Le store doit exister avant le générateur pour recevoir ses tuiles
+        self.load_store(width, height)
+        self.lazy_generator = LazyWorldGenerator(self, seed, width, height, done_bands=done)
+        self.lazy_generator.start()
+
+    def stop_lazy_generation(self):
+        if self.lazy_generator is not None:
+            self.lazy_generator.stop()
+            self.lazy_generator = None
+
+    # ── Store en mémoire ─────────────────────────────────────────────────────
+
+    def load_store(self, width, height):
+        """
+        Ouvre le store du monde : les lectures sont ensuite servies depuis la
+        mémoire et les écritures renvoyées vers SQLite en différé.
+        Backend "mmap" : le fichier d'enregistrements est réutilisé tel quel s'il
+        a été fermé proprement et que SQLite n'a pas été écrit depuis (même
+        tampon d'écriture), sinon il est reconstruit depuis SQLite.
+        """
+        self.close_store()
+        if self.backend == "mmap":
+            self.store = MmapChunkStore.open(self.mmap_path, width, height, self.get_write_stamp())
+            if self.store is None:
+                self.store = MmapChunkStore.create(self.mmap_path, width, height)
+                self._fill_store_from_db()
+        else:
+            self.store = ChunkStore(width, height)
+            self._fill_store_from_db()
+
+        self._write_behind = WriteBehindWriter(self, self.flush_interval)
+        self._write_behind.start()
+        logger.info(f"Monde ouvert ({self.backend}, {self.store.nbytes // 1024} Ko)")
+
+    def _fill_store_from_db(self):
+        self.cur.execute(f"""
+            SELECT x, y, {", ".join(f"COALESCE({name}, 0)" for name in CHUNK_COLUMNS)}
+            FROM chunk
+        """)
+        self.store.load_rows(self.cur.fetchall())
+
+    def close_store(self):
+        """Écrit les dernières modifications du store puis le libère"""
+        if self._write_behind is not None:
+            self._write_behind.stop()
+            self._write_behind = None
+        if self.store is not None:
+            if isinstance(self.store, MmapChunkStore):
+                self.store.stamp = self.get_write_stamp()  # après la dernière écriture
+            self.store.close()
+        self.store = None
+
+    # ── Lecture / écriture de chunks ─────────────────────────────────────────
+
+    def insert_chunk(self, chunk_data: ChunkData) -> bool:
+        """Insère un chunk dans la BDD (ValueError si une valeur sort de 0..255)"""
+        check_values({name: getattr(chunk_data, name) for name in CHUNK_COLUMNS})
+        if self.store is not None:
+            self.store.put(chunk_data)
             return True
-        except Exception as e:
-            logger.error(f"Erreur insertion chunk {chunk_data.position} : {e}")
-            return False
+        with self._pending_lock:
+            self._pending.setdefault(chunk_data.position, {}).update(
+                {name: getattr(chunk_data, name) for name in CHUNK_COLUMNS}
+            )
+        return self._after_write()
+
+    def update_chunks(self, xs, ys, **values):
+        """
+        Modifie des colonnes sur un ensemble de chunks, par exemple
+        update_chunks(xs, ys, owner="bob", gold=0). Chaque valeur est un scalaire
+        ou un tableau aligné sur xs / ys. Les colonnes de chunk acceptent 0..255
+        (ValueError sinon, rien n'est modifié).
+        """
+        unknown = set(values) - set(WRITABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Colonnes inconnues : {sorted(unknown)}")
+        check_values({name: v for name, v in values.items() if name in CHUNK_COLUMNS})
+
+        # Positions hors du monde ignorées (un indice négatif viserait l'autre bord du store)
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        width, height = self._world_size()
+        inside = (xs >= 0) & (ys >= 0)
+        if width and height:
+            inside &= (xs < width) & (ys < height)
+        if not inside.all():
+            logger.warning(f"update_chunks : {int((~inside).sum())} chunks hors du monde ignorés")
+            values = {name: v if np.ndim(v) == 0 else np.asarray(v).ravel()[inside]
+                      for name, v in values.items()}
+            xs, ys = xs[inside], ys[inside]
+            if not len(xs):
+                return True
+
+        if self.store is not None:
+            in_store = {name: v for name, v in values.items() if name in CHUNK_COLUMNS}
+            if in_store:
+                self.store.update_many(xs, ys, **in_store)
+            values = {name: v for name, v in values.items() if name not in in_store}
+            if values:
+                self.store.touch(xs, ys)  # propriétaire / bâtiment : pris par les sauvegardes delta
+
+        if values:
+            xs = np.asarray(xs).ravel()
+            positions = zip(xs.tolist(), np.asarray(ys).ravel().tolist())
+            lists = {name: np.broadcast_to(np.asarray(v), xs.shape).tolist() for name, v in values.items()}
+            with self._pending_lock:
+                for i, position in enumerate(positions):
+                    entry = self._pending.setdefault(position, {})
+                    for name, column in lists.items():
+                        entry[name] = column[i]
+        return self._after_write()
+
+    def _after_write(self):
+        """Sans store, hors lot : écriture immédiate (le store est écrit en différé)"""
+        if self.store is None and not self.in_batch:
+            return self.flush() is not None
+        return True
+
+    # ── Lots d'écritures ─────────────────────────────────────────────────────
+
+    @contextmanager
+    def batch(self):
+        """
+        with db.batch(): ... — les écritures du bloc sont écrites ensemble,
+        en une transaction, à la sortie du lot le plus externe.
+        """
+        with self._batch_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._batch_lock:
+                self._batch_depth -= 1
+                outermost = self._batch_depth == 0
+            if outermost:
+                self.flush()
+
+    @property
+    def in_batch(self):
+        return self._batch_depth > 0
+
+    def flush(self):
+        """
+        Écrit en une transaction les chunks modifiés (store et colonnes SQLite).
+        Retourne le nombre de chunks écrits, None en cas d'erreur (ils restent en attente).
+        """
+        with self._flush_lock:
+            rows = self.store.take_dirty_rows() if self.store is not None else []
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not rows and not pending:
+                return 0
+
+            # Colonnes SQLite regroupées par ensemble de colonnes modifiées
+            groups = {}
+            for (x, y), entry in pending.items():
+                if not entry:
+                    continue
+                names = tuple(sorted(entry))
+                groups.setdefault(names, []).append((x, y, *(entry[name] for name in names)))
+
+            conn = self.connections.get()
+            try:
+                conn.executemany(INSERT_CHUNK_SQL, rows)
+                for names, params in groups.items():
+                    conn.executemany(partial_upsert_sql(names), params)
+                conn.execute(BUMP_WRITE_SEQ_SQL)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Erreur écriture de {len(rows) + len(pending)} chunks : {e}")
+                if self.store is not None:
+                    self.store.mark_dirty((row[0], row[1]) for row in rows)
+                with self._pending_lock:
+                    for position, entry in pending.items():
+                        self._pending[position] = {**entry, **self._pending.get(position, {})}
+                return None
+            return len(rows) + len(pending)
 
     def get_chunk_data(self, x: int, y: int) -> ChunkData | None:
-        """Récupère un chunk depuis la BDD"""
+        """Récupère un chunk depuis le store (ChunkView) ou la BDD"""
+        if self.store is not None:
+            chunk = self.store.get(x, y)
+            if chunk is None and self.lazy_generator is not None:
+                # Pas encore généré : génération synchrone de ce seul chunk
+                self.store.put(self.lazy_generator.generate_chunk(x, y))
+                chunk = self.store.get(x, y)
+            return chunk
+
         try:
-            position_str = f"{x};{y}"
-            self.cur.execute("""
-                SELECT position, oil, gold, iron, copper, coal, water, wood
-                FROM chunk WHERE position = ?
-            """, (position_str,))
+            self.cur.execute(f"""
+                SELECT {", ".join(CHUNK_COLUMNS)}
+                FROM chunk WHERE x = ? AND y = ?
+            """, (x, y))
             row = self.cur.fetchone()
 
             if row is None:
+                if self.lazy_generator is not None:
+                    # Pas encore généré : génération synchrone de ce seul chunk
+                    chunk = self.lazy_generator.generate_chunk(x, y)
+                    self.insert_chunk(chunk)
+                    return chunk
                 logger.warning(f"Chunk {x},{y} non trouvé dans la BDD")
                 return None
 
-            chunk       = ChunkData((x, y))
-            chunk.oil   = row[1]
-            chunk.gold  = row[2]
-            chunk.iron  = row[3]
-            chunk.copper = row[4]
-            chunk.coal  = row[5]
-            chunk.water = row[6]
-            chunk.wood  = row[7]
+            chunk = ChunkData((x, y))
+            for name, value in zip(CHUNK_COLUMNS, row):
+                setattr(chunk, name, value or 0)
             return chunk
 
         except Exception as e:
@@ -127,12 +628,88 @@ class DatabaseHandler:
 
     def chunk_exists(self, x: int, y: int) -> bool:
         """Vérifie si un chunk existe dans la BDD"""
-        position_str = f"{x};{y}"
-        self.cur.execute("SELECT 1 FROM chunk WHERE position = ?", (position_str,))
+        if self.store is not None:
+            return self.store.get(x, y) is not None
+        self.cur.execute("SELECT 1 FROM chunk WHERE x = ? AND y = ?", (x, y))
         return self.cur.fetchone() is not None
 
+    def get_chunks_in_rect(self, x0, y0, x1, y1, columns=CHUNK_COLUMNS):
+        """
+        Chunks du rectangle [x0, x1] x [y0, y1] (bornes incluses), en une lecture.
+        Retourne {colonne: tableau numpy (hauteur, largeur)} plus "present"
+        (masque des chunks existants) ; indexés [y - y0, x - x0].
+        """
+        columns = tuple(columns)
+        unknown = set(columns) - set(CHUNK_COLUMNS)
+        if unknown:
+            raise ValueError(f"Colonnes inconnues : {sorted(unknown)}")
+        if self.store is not None:
+            return self.store.region(x0, y0, x1, y1, columns)
+
+        shape = (max(y1 - y0 + 1, 0), max(x1 - x0 + 1, 0))
+        out = {name: np.zeros(shape, dtype=np.uint8) for name in columns}
+        out["present"] = np.zeros(shape, dtype=bool)
+
+        # Parcours de la clé primaire (x, y) : intervalle sur x, filtre sur y
+        selected = "".join(f", COALESCE({name}, 0)" for name in columns)
+        self.cur.execute(
+            f"SELECT x, y{selected} FROM chunk "
+            "WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ?",
+            (x0, x1, y0, y1),
+        )
+        data = np.asarray(self.cur.fetchall(), dtype=np.int64).reshape(-1, 2 + len(columns))
+        cols, rows = data[:, 0] - x0, data[:, 1] - y0
+        for i, name in enumerate(columns, start=2):
+            out[name][rows, cols] = data[:, i]
+        out["present"][rows, cols] = True
+        return out
+
+    def evaluate_filter(self, expression):
+        """
+        Évalue une expression de filtre (voir utils.filter_expr) sur tout le monde.
+        Retourne (masque, intensité ou None), tableaux (hauteur, largeur) en chunks.
+        Lève FilterSyntaxError si l'expression est invalide.
+        """
+        compiled = compile_filter(expression.strip())
+        width, height = self._world_size()
+        region = self.get_chunks_in_rect(0, 0, width - 1, height - 1, columns=compiled.columns)
+        return compiled.evaluate(region, region["present"])
+
+    def _world_size(self):
+        """(largeur, hauteur) du monde en chunks"""
+        if self.store is not None:
+            return self.store.width, self.store.height
+        manifest = self.get_manifest()
+        return int(manifest.get("width", 0)), int(manifest.get("height", 0))
+
+    def get_resource_stats(self, resource):
+        """
+        Statistiques d'une ressource : total, max, nonzero (chunks où elle est
+        présente) et histogram (nombre de chunks par valeur 0-255, numpy).
+        Tenues à jour par le store, donc en O(1) ; sinon calculées en SQL.
+        """
+        if resource not in RESOURCE_COLUMNS:
+            raise ValueError(f"Ressource inconnue : {resource}")
+        if self.store is not None:
+            return self.store.stats(resource)
+
+        self.cur.execute(RESOURCE_HISTOGRAM_SQL[resource])
+        histogram = np.zeros(256, dtype=np.int64)
+        for value, count in self.cur.fetchall():
+            histogram[min(max(value or 0, 0), 255)] += count
+        used = np.flatnonzero(histogram[1:])
+        return {
+            "total":     int(histogram @ np.arange(256)),
+            "max":       int(used[-1]) + 1 if len(used) else 0,
+            "nonzero":   int(histogram[1:].sum()),
+            "histogram": histogram,
+        }
+
     def get_world_info(self):
         """Retourne des infos sur le monde chargé"""
+        if self.store is not None:
+            return self.store.world_info()
+
         self.cur.execute("SELECT COUNT(*) FROM chunk")
         chunk_count = self.cur.fetchone()[0]
 
@@ -146,7 +723,163 @@ class DatabaseHandler:
             "total_oil":   totals[2] or 0,
         }
 
+    # ── Sauvegardes ──────────────────────────────────────────────────────────
+
+    def snapshot(self, ledgers=None, base_epoch=None, blocking=True) -> SaveState | None:
+        """
+        Copie instantanée du monde pour une sauvegarde (store requis).
+        base_epoch : époque d'une sauvegarde complète de cette session ; seuls
+        les chunks modifiés depuis sont alors copiés (sauvegarde delta).
+        blocking=False : retourne None au lieu d'attendre une écriture en cours.
+        """
+        finish = self.capture_snapshot(ledgers, base_epoch, blocking)
+        return None if finish is None else finish()
+
+    def capture_snapshot(self, ledgers=None, base_epoch=None, blocking=True):
+        """
+        Partie de snapshot() à faire entre deux frames : copie des colonnes du
+        store et des revendications en attente, sans aucune E/S.
+        Retourne une fonction qui termine la copie (revendications lues dans
+        SQLite, manifeste) et retourne le SaveState, à appeler une seule fois,
+        depuis n'importe quel thread. Jusque-là, les écritures vers SQLite
+        attendent : les revendications lues sont celles de l'instant de la copie.
+        None si blocking=False et qu'une écriture est en cours.
+        """
+        if self.store is None:
+            raise RuntimeError("Sauvegarde impossible : aucun store chargé")
+
+        # Pas de flush jusqu'à la lecture : propriétaires = SQLite + modifications en attente
+        if not self._flush_lock.acquire(blocking=blocking):
+            return None
+        try:
+            columns, present, versions, epoch = self.store.snapshot()
+            with self._pending_lock:
+                pending = [(position, dict(entry)) for position, entry in self._pending.items()
+                           if "owner" in entry or "build" in entry]
+            ledgers = {player: dict(ledger) for player, ledger in (ledgers or {}).items()}
+            session, created = self.store.session, time.time()
+        except BaseException:
+            self._flush_lock.release()
+            raise
+
+        def finish():
+            try:
+                claims = {(x, y): [owner, build] for x, y, owner, build in
+                          self.cur.execute(f"SELECT x, y, owner, build FROM chunk WHERE {CLAIMED_WHERE}")}
+                manifest = self.get_manifest()
+            finally:
+                self._flush_lock.release()
+            for position, entry in pending:
+                claim = claims.setdefault(position, [None, None])
+                claim[0] = entry.get("owner", claim[0])
+                claim[1] = entry.get("build", claim[1])
+
+            state = SaveState(
+                width=present.shape[1], height=present.shape[0],
+                columns=dict(zip(CHUNK_COLUMNS, columns)),
+                present=present,
+                ledgers=ledgers,
+                manifest=manifest,
+                session=session,
+                epoch=epoch,
+                created=created,
+                **self._claim_arrays(claims, present.shape),
+            )
+            if base_epoch is None:
+                return state
+
+            # Delta : chunks modifiés depuis la sauvegarde de base
+            cells = np.flatnonzero(versions > base_epoch)
+            state.cells = cells.astype(np.uint32)
+            state.base_epoch = base_epoch
+            state.columns = {name: column.reshape(-1)[cells] for name, column in state.columns.items()}
+            state.present = present.reshape(-1)[cells]
+            state.owner = state.owner.reshape(-1)[cells]
+            state.build = state.build.reshape(-1)[cells]
+            return state
+
+        return finish
+
+    @staticmethod
+    def _claim_arrays(claims, shape):
+        """{(x, y): [owner, build]} → owner (indices dans owner_names), build, owner_names"""
+        height, width = shape
+        owner_names = [None] + sorted({owner for owner, _ in claims.values() if owner is not None})
+        index_of = {name: i for i, name in enumerate(owner_names)}
+        owner = np.zeros((height, width), dtype=np.uint16)
+        build = np.full((height, width), NO_BUILD, dtype=np.int32)
+        for (x, y), (name, building) in claims.items():
+            if 0 <= x < width and 0 <= y < height:
+                owner[y, x] = index_of[name]
+                build[y, x] = NO_BUILD if building is None else building
+        return {"owner": owner, "build": build, "owner_names": owner_names}
+
+    def restore_snapshot(self, state: SaveState):
+        """
+        Remplace le monde par une sauvegarde complète (store requis).
+        L'écriture vers SQLite suit en différé ; retourne les soldes des joueurs.
+        """
+        if state.is_delta:
+            raise ValueError("Appliquer le delta à sa sauvegarde complète (apply_delta) avant de restaurer")
+        if self.store is None or (state.width, state.height) != (self.store.width, self.store.height):
+            raise ValueError("Sauvegarde incompatible avec le monde ouvert")
+        if state.manifest != self.get_manifest():
+            # Autre seed / carte / générateur : l'écrire corromprait la BDD en cache de ce monde
+            raise ValueError("Sauvegarde d'un autre monde (manifeste différent)")
+
+        self.store.replace_all(state.columns, state.present)
+
+        # Propriétaires et bâtiments : on efface les anciens, puis on pose ceux de la sauvegarde
+        old = self.cur.execute(f"SELECT x, y FROM chunk WHERE {CLAIMED_WHERE}").fetchall()
+        with self._pending_lock:
+            for position, entry in self._pending.items():
+                entry.pop("owner", None)
+                entry.pop("build", None)
+        if old:
+            xs, ys = zip(*old)
+            self.update_chunks(xs, ys, owner=None, build=None)
+
+        ys, xs = np.nonzero((state.owner > 0) | (state.build != NO_BUILD))
+        if len(xs):
+            names = np.array(state.owner_names, dtype=object)
+            builds = state.build[ys, xs].astype(object)
+            builds[builds == NO_BUILD] = None
+            self.update_chunks(xs, ys, owner=names[state.owner[ys, xs]], build=builds)
+
+        logger.info(f"Sauvegarde restaurée ({self.store.chunk_count} chunks, {len(xs)} revendiqués)")
+        return {player: dict(ledger) for player, ledger in state.ledgers.items()}
+
+    # ── Ancienne BDD ─────────────────────────────────────────────────────────
+
+    def import_legacy_claims(self, path):
+        """
+        Reprend dans ce monde (store chargé) les revendications (owner, build)
+        d'une ancienne BDD unique, ex. data/chunk_base.db. Elle est d'abord
+        migrée vers le schéma à clé entière à l'ouverture ; ses ressources,
+        issues d'un ancien générateur, ne sont pas reprises.
+        Retourne le nombre de chunks repris.
+        """
+        legacy = DatabaseHandler(self.game, db_name=path)
+        try:
+            rows = legacy.cur.execute(f"SELECT x, y, owner, build FROM chunk WHERE {CLAIMED_WHERE}").fetchall()
+        finally:
+            legacy.close_connection()
+
+        width, height = self._world_size()
+        rows = [row for row in rows if 0 <= row[0] < width and 0 <= row[1] < height]
+        if not rows:
+            return 0
+        for x, y, _, _ in rows:
+            self.get_chunk_data(x, y)  # génère les chunks pas encore générés avant d'y poser la revendication
+        xs, ys, owners, builds = zip(*rows)
+        self.update_chunks(xs, ys, owner=np.array(owners, dtype=object), build=np.array(builds, dtype=object))
+        self.flush()
+        return len(rows)
+
     def close_connection(self):
         """Ferme la connexion à la BDD"""
-        self.conn.close()
+        self.stop_lazy_generation()
+        self.close_store()
+        self.flush()
+        self.connections.close_all()
         logger.info("Connexion BDD fermée")
\ No newline at end of file
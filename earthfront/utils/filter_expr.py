@@ -0,0 +1,252 @@
+"""
+Petit langage de filtres sur les colonnes des chunks.
+
+    gold > 50 and water < 30
+    iron + copper >= 120, weighted colour by coal
+    not (sand or snow) and (oil * 2 > gold)
+
+Une expression est analysée une seule fois (cache LRU) puis évaluée en numpy
+sur des colonnes entières ; le résultat est un masque des chunks retenus et,
+si une pondération est donnée, une intensité par chunk.
+
+Grammaire :
+    filtre      := expr [ "," "weighted" ("colour" | "color") "by" expr ]
+    expr        := et ( "or" et )*
+    et          := non ( "and" non )*
+    non         := "not" non | comparaison
+    comparaison := somme [ ("<" | "<=" | ">" | ">=" | "==" | "=" | "!=") somme ]
+    somme       := produit ( ("+" | "-") produit )*
+    produit     := unaire ( ("*" | "/" | "%") unaire )*
+    unaire      := "-" unaire | nombre | colonne | "(" expr ")"
+Une colonne seule dans une condition vaut "colonne > 0".
+"""
+import operator
+import re
+from functools import lru_cache
+import numpy as np
+from .gen_chunk_bdd import CHUNK_COLUMNS
+
+FILTER_CACHE_SIZE = 64  # expressions analysées gardées en cache
+
+TOKEN_RE = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([A-Za-z_]\w*)|(<=|>=|==|!=|[<>=+\-*/%(),]))")
+
+COMPARISONS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "=": operator.eq, "!=": operator.ne,
+}
+ARITHMETIC = {"+": np.add, "-": np.subtract, "*": np.multiply, "%": np.remainder}
+KEYWORDS = {"and", "or", "not", "weighted", "colour", "color", "by"}
+
+
+class FilterSyntaxError(ValueError):
+    """Expression de filtre invalide (pos : position du caractère fautif)"""
+
+    def __init__(self, message, pos):
+        super().__init__(f"{message} (position {pos})")
+        self.pos = pos
+
+
+def tokenize(text):
+    """Liste de (valeur, position) ; les nombres sont convertis, les mots en minuscules"""
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise FilterSyntaxError(f"caractère inattendu {text[pos:].strip()[:1]!r}", pos)
+        number, word, symbol = match.groups()
+        start = match.start(match.lastindex)
+        if number is not None:
+            tokens.append((float(number) if "." in number else int(number), start))
+        elif word is not None:
+            tokens.append((word.lower(), start))
+        else:
+            tokens.append((symbol, start))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Analyse descendante récursive → arbre de tuples"""
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.i = 0
+        self.end = len(text)
+
+    # ── Lecture des jetons ───────────────────────────────────────────────────
+
+    def peek(self):
+        return self.tokens[self.i][0] if self.i < len(self.tokens) else None
+
+    def pos(self):
+        return self.tokens[self.i][1] if self.i < len(self.tokens) else self.end
+
+    def take(self, *expected):
+        value = self.peek()
+        if expected and value not in expected:
+            found = "fin de l'expression" if value is None else repr(value)
+            raise FilterSyntaxError(f"attendu {' ou '.join(expected)}, trouvé {found}", self.pos())
+        self.i += 1
+        return value
+
+    # ── Règles ───────────────────────────────────────────────────────────────
+
+    def parse(self):
+        condition = self.expr()
+        weight = None
+        if self.peek() == ",":
+            self.take(",")
+            self.take("weighted")
+            self.take("colour", "color")
+            self.take("by")
+            weight = self.expr()
+        if self.peek() is not None:
+            raise FilterSyntaxError(f"jeton inattendu {self.peek()!r}", self.pos())
+        return condition, weight
+
+    def expr(self):
+        node = self.conjunction()
+        while self.peek() == "or":
+            self.take()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() == "and":
+            self.take()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() == "not":
+            self.take()
+            return ("not", self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.sum()
+        if self.peek() in COMPARISONS:
+            op = self.take()
+            node = ("cmp", op, node, self.sum())
+        return node
+
+    def sum(self):
+        node = self.product()
+        while self.peek() in ("+", "-"):
+            node = ("arith", self.take(), node, self.product())
+        return node
+
+    def product(self):
+        node = self.unary()
+        while self.peek() in ("*", "/", "%"):
+            node = ("arith", self.take(), node, self.unary())
+        return node
+
+    def unary(self):
+        value, pos = self.peek(), self.pos()
+        if value == "-":
+            self.take()
+            return ("neg", self.unary())
+        if value == "(":
+            self.take()
+            node = self.expr()
+            self.take(")")
+            return node
+        if isinstance(value, (int, float)):
+            self.take()
+            return ("num", value)
+        if isinstance(value, str) and (value[0].isalpha() or value[0] == "_") and value not in KEYWORDS:
+            if value not in CHUNK_COLUMNS:
+                raise FilterSyntaxError(f"colonne inconnue {value!r}", pos)
+            self.take()
+            return ("col", value)
+        found = "fin de l'expression" if value is None else repr(value)
+        raise FilterSyntaxError(f"valeur attendue, trouvé {found}", pos)
+
+
+def _columns_of(node):
+    if node[0] == "col":
+        return {node[1]}
+    return set().union(*(_columns_of(child) for child in node[1:] if isinstance(child, tuple)))
+
+
+def _evaluate(node, columns):
+    """Évalue un nœud : tableau numérique (int32/float32) ou booléen"""
+    kind = node[0]
+    if kind == "num":
+        return node[1]
+    if kind == "col":
+        return columns[node[1]].astype(np.int32)
+    if kind == "neg":
+        return -_as_number(_evaluate(node[1], columns))
+    if kind == "arith":
+        left, right = _as_number(_evaluate(node[2], columns)), _as_number(_evaluate(node[3], columns))
+        with np.errstate(divide="ignore", invalid="ignore"):  # x / 0 et x % 0 valent 0
+            if node[1] == "/":
+                return np.nan_to_num(np.true_divide(left, right), nan=0.0, posinf=0.0, neginf=0.0)
+            return ARITHMETIC[node[1]](left, right)
+    if kind == "cmp":
+        return COMPARISONS[node[1]](_evaluate(node[2], columns), _evaluate(node[3], columns))
+    if kind == "not":
+        return ~_as_mask(_evaluate(node[1], columns))
+    if kind == "and":
+        return _as_mask(_evaluate(node[1], columns)) & _as_mask(_evaluate(node[2], columns))
+    if kind == "or":
+        return _as_mask(_evaluate(node[1], columns)) | _as_mask(_evaluate(node[2], columns))
+    raise ValueError(f"nœud inconnu {kind}")
+
+
+def _as_number(value):
+    """Une condition utilisée dans un calcul vaut 1 ou 0 ("(gold > 5) + (iron > 3)")"""
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        return value.astype(np.int32)
+    return value
+
+
+def _as_mask(value):
+    """Une valeur numérique utilisée comme condition vaut "valeur > 0" """
+    value = np.asarray(value)
+    return value if value.dtype == bool else value > 0
+
+
+class CompiledFilter:
+    """Expression analysée, évaluable sur des colonnes numpy"""
+
+    def __init__(self, text, condition, weight):
+        self.text = text
+        self._condition = condition
+        self._weight = weight
+        self.columns = tuple(sorted(_columns_of(condition) | (_columns_of(weight) if weight else set())))
+
+    @property
+    def weighted(self):
+        return self._weight is not None
+
+    def evaluate(self, columns, present=None):
+        """
+        columns : {colonne: tableau}, tous de même forme (ex. get_chunks_in_rect).
+        Retourne (masque bool, intensité float32 dans [0, 1] ou None).
+        """
+        shape = columns[self.columns[0]].shape if self.columns else np.shape(present)
+        mask = np.broadcast_to(_as_mask(_evaluate(self._condition, columns)), shape)
+        if present is not None:
+            mask = mask & present
+
+        if self._weight is None:
+            return mask, None
+        weight = np.broadcast_to(np.asarray(_evaluate(self._weight, columns), dtype=np.float32), shape)
+        selected = weight[mask]
+        if selected.size == 0:
+            return mask, np.zeros(shape, dtype=np.float32)
+        low, high = float(selected.min()), float(selected.max())
+        intensity = (weight - low) / (high - low) if high > low else np.ones(shape, dtype=np.float32)
+        return mask, np.where(mask, intensity, 0).astype(np.float32)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def compile_filter(text) -> CompiledFilter:
+    """Analyse une expression (résultat mis en cache par texte)"""
+    condition, weight = _Parser(text).parse()
+    return CompiledFilter(text, condition, weight)
@@ -1,71 +1,337 @@
+import hashlib
+import threading
+import numpy as np
 from PIL import Image
-from random import Random
 from .models import ChunkData
+from .png_strips import PngStripReader, UnsupportedPNG
+from .logger import Logger
+
+logger = Logger()
+
+CHUNK_SIZE = 10  # côté d'un chunk en pixels
+BAND_WIDTH = 8   # nombre de colonnes de chunks par bande de génération
+GENERATOR_VERSION = 2  # à incrémenter dès que les règles de génération changent
+MAP_PATH = "./src/carte.png"
+
+# Palette de référence de carte.png (l'ordre donne l'indice de classe)
+TERRAINS = ("water", "grass", "snow", "sand")
+PALETTE = np.array([
+    (120, 190, 255),  # water
+    (0, 180, 0),      # grass
+    (255, 255, 255),  # snow
+    (220, 200, 140),  # sand
+], dtype=np.int32)
+
+
+def nearest_terrain(colors):
+    """
+    Renvoie, pour chaque couleur RGB (tableau N x 3), l'indice du terrain
+    de la palette le plus proche (distance euclidienne).
+    """
+    colors = np.asarray(colors, dtype=np.int32).reshape(-1, 1, 3)
+    dist = ((colors - PALETTE[None, :, :]) ** 2).sum(axis=2)
+    return dist.argmin(axis=1).astype(np.uint8)
+
+
+def palette_lut(palette):
+    """Table indice de palette → indice de terrain (256 entrées)"""
+    palette = np.asarray(palette, dtype=np.int32).reshape(-1, 3)[:256]
+    lut = np.zeros(256, dtype=np.uint8)
+    lut[:len(palette)] = nearest_terrain(palette)
+    return lut
+
+
+def classify_rgb(rgb):
+    """
+    Convertit un tableau de pixels RGB (... x 3) en indices de terrain.
+    Chaque couleur distincte n'est comparée qu'une fois à la palette :
+    on construit une table de correspondance puis on l'applique à tout le tableau.
+    """
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    packed = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    uniques, inverse = np.unique(packed, return_inverse=True)
+    unique_rgb = np.stack([(uniques >> 16) & 0xFF, (uniques >> 8) & 0xFF, uniques & 0xFF], axis=1)
+    lut = nearest_terrain(unique_rgb)
+    return lut[inverse].reshape(packed.shape)
+
+
+def classify_image(img):
+    """Convertit une image PIL en tableau (hauteur x largeur) d'indices de terrain"""
+    if img.mode == "P":
+        # Image indexée : la table se construit directement sur sa palette
+        return palette_lut(img.getpalette()[:768])[np.asarray(img)]
+    return classify_rgb(np.asarray(img.convert("RGB")))
+
+
+def terrain_histograms(classes, chunk_size=CHUNK_SIZE):
+    """
+    Réduit un tableau de classes (hauteur x largeur) en histogrammes par chunk.
+    Retourne un tableau (lignes, colonnes, len(TERRAINS)) : pour chaque chunk,
+    le nombre de pixels de chaque terrain. Les bords incomplets sont ignorés.
+    """
+    rows = classes.shape[0] // chunk_size
+    cols = classes.shape[1] // chunk_size
+    blocks = classes[:rows * chunk_size, :cols * chunk_size].reshape(rows, chunk_size, cols, chunk_size)
+
+    counts = np.empty((rows, cols, len(TERRAINS)), dtype=np.uint16)
+    for k in range(len(TERRAINS)):
+        counts[..., k] = (blocks == k).sum(axis=(1, 3))
+    return counts
+
+
+# ── Génération des ressources ────────────────────────────────────────────────
+# Générateur sans état, basé sur un compteur : chaque tirage est un hash
+# (splitmix64) de (seed, x, y, n° de tirage). La valeur d'un chunk ne dépend
+# que de la seed et de ses coordonnées, quel que soit l'ordre de génération.
+
+MINERALS = ("gold", "iron", "copper", "coal")
+# Ordre des colonnes ressources dans la table chunk
+RESOURCE_COLUMNS = ("oil", "gold", "iron", "copper", "coal", "water", "wood")
+# Toutes les colonnes de données d'un chunk : ressources puis terrains restants
+CHUNK_COLUMNS = RESOURCE_COLUMNS + ("grass", "snow", "sand")
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix64(z):
+    """Finaliseur splitmix64 (vectorisé, arithmétique modulo 2^64)"""
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def chunk_keys(seed, xs, ys):
+    """Clé 64 bits propre à chaque chunk, dérivée de (seed, x, y)"""
+    with np.errstate(over="ignore"):
+        key = _mix64(np.full(len(xs), (seed & 0xFFFFFFFFFFFFFFFF), dtype=np.uint64) + _GOLDEN)
+        key = _mix64(key ^ np.asarray(xs, dtype=np.int64).astype(np.uint64))
+        key = _mix64(key ^ np.asarray(ys, dtype=np.int64).astype(np.uint64))
+    return key
+
+
+def draw_randint(keys, counter, low, high):
+    """Tirage n° `counter` de chaque chunk, entier uniforme dans [low, high]"""
+    with np.errstate(over="ignore"):
+        u = _mix64(keys + np.uint64(counter + 1) * _GOLDEN) >> np.uint64(32)
+        return low + ((u * np.uint64(high - low + 1)) >> np.uint64(32)).astype(np.int32)
+
+
+def _roll_deposit(keys, stream, eligible, low_below, high_above):
+    """
+    Règle commune des gisements : p dans [0, 50], gisement faible (10-40)
+    si p < low_below, riche (60-100) si p > high_above, sinon rien.
+    """
+    p = draw_randint(keys, 2 * stream, 0, 50)
+    low = draw_randint(keys, 2 * stream + 1, 10, 40)
+    high = draw_randint(keys, 2 * stream + 1, 60, 100)
+    out = np.where(p < low_below, low, np.where(p > high_above, high, 0))
+    return np.where(eligible, out, 0).astype(np.int32)
+
+
+def generate_resources(seed, xs, ys, counts):
+    """
+    Calcule les colonnes ressources d'un lot de chunks.
+    xs, ys : coordonnées (tableaux de même longueur N)
+    counts : histogrammes de terrain correspondants (N x len(TERRAINS))
+    Retourne {colonne: tableau de N valeurs} pour CHUNK_COLUMNS.
+    """
+    counts = np.asarray(counts, dtype=np.int32)
+    water, grass, snow, sand = (counts[:, k] for k in range(len(TERRAINS)))
+    keys = chunk_keys(seed, xs, ys)
+
+    columns = {"oil": _roll_deposit(keys, 0, (water >= 90) | (sand + snow >= 90), 30, 40)}
+    for i, mineral in enumerate(MINERALS, start=1):
+        columns[mineral] = _roll_deposit(keys, i, water < 90, 30, 45)
+    columns["water"] = water
+    columns["wood"] = grass + snow // 2
+    columns["grass"], columns["snow"], columns["sand"] = grass, snow, sand
+    return columns
+
+
+def classify_map_streamed(map_path, chunk_size=CHUNK_SIZE):
+    """
+    Histogrammes de terrain de tous les chunks, en décodant le PNG par bandes
+    d'une ligne de chunks : la mémoire ne dépend que de la largeur de la carte.
+    Lève UnsupportedPNG si le fichier ne peut pas être lu par bandes.
+    """
+    reader = PngStripReader(map_path)
+    lut = palette_lut(reader.palette) if reader.color_type == 3 else None
+
+    rows = []
+    for strip in reader.strips(chunk_size):
+        if strip.shape[0] < chunk_size:
+            break  # ligne de chunks incomplète en bas de la carte
+        classes = lut[strip] if lut is not None else classify_rgb(strip)
+        rows.append(terrain_histograms(classes, chunk_size))
+
+    if not rows:
+        return np.zeros((0, reader.width // chunk_size, len(TERRAINS)), dtype=np.uint16)
+    return np.concatenate(rows)
+
+
+def classify_chunk_row(map_path, row, chunk_size=CHUNK_SIZE):
+    """
+    Histogrammes de terrain d'une seule ligne de chunks (colonnes, len(TERRAINS)) :
+    la carte n'est décodée que jusqu'à cette ligne, et seule elle est classée.
+    Lève UnsupportedPNG si le fichier ne peut pas être lu par bandes.
+    """
+    reader = PngStripReader(map_path)
+    lut = palette_lut(reader.palette) if reader.color_type == 3 else None
+    for i, strip in enumerate(reader.strips(chunk_size)):
+        if i == row:
+            if strip.shape[0] < chunk_size:
+                break
+            classes = lut[strip] if lut is not None else classify_rgb(strip)
+            return terrain_histograms(classes, chunk_size)[0]
+    raise IndexError(f"ligne de chunks {row} hors de la carte")
+
+
+def split_bands(width, band_width=BAND_WIDTH):
+    """Découpe les colonnes [0, width) en bandes (x0, x1) consécutives"""
+    return [(x0, min(x0 + band_width, width)) for x0 in range(0, width, band_width)]
+
+
+def map_fingerprint(map_path=MAP_PATH):
+    """Empreinte SHA-256 du fichier de carte (lu par blocs)"""
+    digest = hashlib.sha256()
+    with open(map_path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_world_manifest(seed, width, height, map_path=MAP_PATH):
+    """
+    Manifeste décrivant un monde généré : deux BDD ayant le même manifeste
+    contiennent exactement les mêmes chunks. Les valeurs sont stockées en texte.
+    """
+    return {
+        "map_hash":          map_fingerprint(map_path),
+        "seed":              str(seed),
+        "chunk_size":        str(CHUNK_SIZE),
+        "generator_version": str(GENERATOR_VERSION),
+        "width":             str(width),
+        "height":            str(height),
+        "band_width":        str(BAND_WIDTH),
+    }
 
 
 class ChunkDataExtractor:
-    def __init__(self, seed=None):
-        self.map_path = "./src/carte.png"
-        self.img_map = Image.open(self.map_path).convert("RGB")
-        self.pixels = self.img_map.load()
+    def __init__(self, seed=None, terrain_counts=None, map_path=MAP_PATH, lazy=False):
+        """
+        terrain_counts : histogrammes déjà calculés (ex. par le processus parent)
+        lazy           : ne pas classer la carte ici ; load_terrain() le fera
+                         plus tard (thread de fond), chunk_counts() ne classe
+                         d'ici là que la ligne de chunks demandée
+        """
+        self.map_path = map_path
 
         # Seed pour la génération pseudo-aléatoire
         self.seed = seed if seed is not None else 42  # Seed par défaut
-        self.base_random = Random(self.seed)  # Générateur de base (non utilisé directement)
 
-    def _get_chunk_random(self, x, y):
-        """
-        Crée un générateur Random spécifique pour ce chunk
-        en utilisant la seed de base + les coordonnées du chunk
-        """
-        chunk_seed = hash((self.seed, x, y)) & 0xFFFFFFFF  # Seed unique par chunk
-        return Random(chunk_seed)
+        # Histogrammes de terrain de tous les chunks, calculés en une passe
+        if terrain_counts is None and not lazy:
+            terrain_counts = self.classify_map()
+        self.terrain_counts = terrain_counts
 
-    def get_chunk_pixels(self, x, y):
-        chunk_data = ChunkData((x, y))
+        self._rows_lock = threading.Lock()
+        self._row_counts = {}  # ligne de chunks → histogrammes, en attendant load_terrain()
+
+    def classify_map(self):
+        """Décode la carte et calcule les histogrammes de terrain de tous les chunks"""
+        try:
+            return classify_map_streamed(self.map_path)
+        except UnsupportedPNG as e:
+            # Format non lisible par bandes : décodage complet par PIL
+            logger.info(f"Carte décodée en entier ({e})")
+            with Image.open(self.map_path) as img:
+                classes = classify_image(img)
+            return terrain_histograms(classes)
 
-        colors = {
-            (120, 190, 255): "water",
-            (0, 180, 0): "grass",
-            (255, 255, 255): "snow",
-            (220, 200, 140): "sand"
-        }
+    def load_terrain(self):
+        """Calcule les histogrammes de toute la carte s'ils manquent"""
+        if self.terrain_counts is None:
+            counts = self.classify_map()
+            with self._rows_lock:
+                self.terrain_counts = counts
+                self._row_counts.clear()
+        return self.terrain_counts
 
-        for r in range(10):
-            for c in range(10):
+    def chunk_counts(self, x, y):
+        """Histogramme de terrain d'un chunk, sans attendre load_terrain()"""
+        counts = self.terrain_counts
+        if counts is not None:
+            return counts[y, x]
+
+        with self._rows_lock:
+            if self.terrain_counts is not None:
+                return self.terrain_counts[y, x]
+            row = self._row_counts.get(y)
+            if row is None:
                 try:
-                    pixel = self.pixels[x * 10 + r, y * 10 + c]
-                    setattr(chunk_data, colors[pixel], getattr(chunk_data, colors[pixel]) + 1)
-                except:
-                    print(f"chunk n°{x},{y} - pixel n°{r},{c}")
+                    row = classify_chunk_row(self.map_path, y)
+                except UnsupportedPNG:
+                    # Pas de lecture par bandes : toute la carte, une seule fois
+                    self.terrain_counts = self.classify_map()
+                    return self.terrain_counts[y, x]
+                self._row_counts[y] = row
+            return row[x]
+
+    def get_chunk_pixels(self, x, y):
+        chunk_data = ChunkData((x, y))
+
+        counts = self.chunk_counts(x, y)
+        for k, terrain in enumerate(TERRAINS):
+            setattr(chunk_data, terrain, int(counts[k]))
 
         return chunk_data
 
     def get_chunk_data(self, x, y):
         chunk_data = self.get_chunk_pixels(x, y)
 
-        # Utiliser le générateur random spécifique à ce chunk
-        rng = self._get_chunk_random(x, y)
+        counts = self.chunk_counts(x, y)
+        columns = generate_resources(self.seed, np.array([x]), np.array([y]), counts[None, :])
+        for name in CHUNK_COLUMNS:
+            setattr(chunk_data, name, int(columns[name][0]))
+
+        return chunk_data
+
+    def generate_columns(self, xs, ys):
+        """Génère les colonnes ressources d'un lot de chunks en une fois"""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        return generate_resources(self.seed, xs, ys, self.terrain_counts[ys, xs])
 
-        if chunk_data.water >= 90 or chunk_data.sand + chunk_data.snow >= 90:
-            p = rng.randint(0, 50)
-            if p < 30:
-                chunk_data.oil = rng.randint(10, 40)
-            elif p > 40:
-                chunk_data.oil = rng.randint(60, 100)
+    def get_band_rows(self, x0, x1, height):
+        """
+        Génère les lignes BDD des chunks des colonnes [x0, x1), dans l'ordre
+        de la génération série (x puis y).
+        """
+        return self.get_region_rows(x0, x1, 0, height)
 
-        if chunk_data.water < 90:
-            ressources = ["gold", "iron", "copper", "coal"]
-            for ressource in ressources:
-                p = rng.randint(0, 50)
-                if p < 30:
-                    setattr(chunk_data, ressource, rng.randint(10, 40))
-                elif p > 45:
-                    setattr(chunk_data, ressource, rng.randint(60, 100))
+    def get_region_rows(self, x0, x1, y0, y1):
+        """Génère les lignes BDD des chunks du rectangle [x0, x1) x [y0, y1)"""
+        xs = np.repeat(np.arange(x0, x1), y1 - y0)
+        ys = np.tile(np.arange(y0, y1), x1 - x0)
+        columns = self.generate_columns(xs, ys)
+        return list(zip(xs.tolist(), ys.tolist(), *(columns[name].tolist() for name in CHUNK_COLUMNS)))
 
-        chunk_data.wood = int(chunk_data.grass + chunk_data.snow / 2)
 
-        return chunk_data
+# ── Workers du pool de processus ─────────────────────────────────────────────
+# Chaque processus garde son propre extracteur, initialisé une seule fois
+# avec les histogrammes calculés par le parent (la carte n'est pas relue).
+
+_worker_extractor = None
+
+
+def init_band_worker(seed, terrain_counts):
+    global _worker_extractor
+    _worker_extractor = ChunkDataExtractor(seed=seed, terrain_counts=terrain_counts)
+
+
+def generate_band(band):
+    x0, x1, height = band
+    return _worker_extractor.get_band_rows(x0, x1, height)
 
 
 # Exemple d'utilisation
@@ -80,4 +346,4 @@ if __name__ == "__main__":
 
     # Seed différente = résultat différent
     extractor3 = ChunkDataExtractor(seed=99999)
-    print("Test 3:", extractor3.get_chunk_data(70, 50))
\ No newline at end of file
+    print("Test 3:", extractor3.get_chunk_data(70, 50))
@@ -0,0 +1,96 @@
+"""
+Stockage des chunks dans un fichier projeté en mémoire (mmap).
+Un enregistrement de taille fixe par chunk, à l'adresse y * largeur + x :
+l'ouverture ne lit rien et chaque lecture est un simple accès mémoire.
+"""
+import os
+import struct
+import numpy as np
+from .chunk_store import ChunkStore
+from .gen_chunk_bdd import CHUNK_COLUMNS
+from .logger import Logger
+
+logger = Logger()
+
+MMAP_SUFFIX  = ".chunks"  # fichier mmap rangé à côté de la BDD du monde
+MMAP_MAGIC   = b"EFCHUNKS"
+MMAP_VERSION = 2
+HEADER_SIZE  = 64
+# magic, version, largeur, hauteur, taille d'enregistrement, fermé proprement,
+# tampon d'écriture SQLite à la fermeture (jeton, compteur)
+HEADER_FORMAT = "<8sIIIIBqq"
+NO_STAMP = (0, -1)
+
+# Enregistrement : présence + une valeur uint8 par colonne
+RECORD_DTYPE = np.dtype([("present", "?")] + [(name, "u1") for name in CHUNK_COLUMNS])
+
+
+class MmapChunkStore(ChunkStore):
+    """
+    ChunkStore dont les colonnes sont des vues sur un fichier mmap.
+    Le fichier est marqué "non fermé" à l'ouverture : après un arrêt brutal il
+    est rejeté par open() et reconstruit depuis SQLite. À la fermeture, il garde
+    le tampon d'écriture de SQLite (stamp, fourni par le DatabaseHandler) : si
+    SQLite a été écrit depuis, par un autre backend, open() le rejette aussi.
+    """
+
+    def __init__(self, path, width, height, mode):
+        self.path = path
+        self.stamp = NO_STAMP
+        self._records = np.memmap(path, dtype=RECORD_DTYPE, mode=mode,
+                                  offset=HEADER_SIZE, shape=(height, width))
+        super().__init__(width, height)
+        self._write_header(clean=False)
+
+    def _allocate(self):
+        columns = {name: self._records[name] for name in CHUNK_COLUMNS}
+        return columns, self._records["present"]
+
+    # ── Fichier ──────────────────────────────────────────────────────────────
+
+    @classmethod
+    def create(cls, path, width, height):
+        """Crée un fichier vide (aucun chunk présent)"""
+        with open(path, "wb") as f:
+            f.truncate(HEADER_SIZE + width * height * RECORD_DTYPE.itemsize)
+        return cls(path, width, height, mode="r+")
+
+    @classmethod
+    def open(cls, path, width, height, stamp):
+        """
+        Ouvre un fichier existant ; None s'il est absent, incompatible, mal fermé
+        ou fermé avec un autre tampon d'écriture que stamp (SQLite modifié depuis).
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, version, w, h, record_size, clean, token, seq = struct.unpack(HEADER_FORMAT, header)
+        except (OSError, struct.error):
+            return None
+
+        expected = (MMAP_MAGIC, MMAP_VERSION, width, height, RECORD_DTYPE.itemsize, 1)
+        if (magic, version, w, h, record_size, clean) != expected:
+            logger.warning(f"Fichier mmap {path} ignoré (incompatible ou mal fermé)")
+            return None
+        if (token, seq) != tuple(stamp):
+            logger.warning(f"Fichier mmap {path} ignoré (BDD modifiée depuis sa fermeture)")
+            return None
+        if os.path.getsize(path) < HEADER_SIZE + width * height * record_size:
+            return None
+        return cls(path, width, height, mode="r+")
+
+    def _write_header(self, clean):
+        header = struct.pack(HEADER_FORMAT, MMAP_MAGIC, MMAP_VERSION, self.width,
+                             self.height, RECORD_DTYPE.itemsize, int(clean), *self.stamp)
+        with open(self.path, "r+b") as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        """Écrit les pages modifiées sur disque puis marque le fichier fermé proprement"""
+        self._records.flush()
+        self._write_header(clean=True)
+        self._records = None
+        self.columns = {}
+        self.present = None
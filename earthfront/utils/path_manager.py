@@ -8,12 +8,13 @@ class Images:
     CARTES = f"{BASE}/carte.png"
     ICON_VIEW_GRID = f"{BASE}/view_grid.png"
     ICON_QUIT = f"{BASE}/icon_quit.png"
+    ICON_RESOURCES = f"{BASE}/icon_resources.png"
 
 def check_path():
     logger.info("Checking paths...")
     """Vérifie que les fichiers d'images existent"""
     os.makedirs(Images.BASE, exist_ok=True)
-    for img in [Images.CARTES, Images.ICON_VIEW_GRID]:
+    for img in [Images.CARTES, Images.ICON_VIEW_GRID, Images.ICON_RESOURCES]:
         if not os.path.exists(img):
             logger.error(f"Fichier manquant : {img}")
             raise FileNotFoundError(f"Fichier manquant : {img}")
@@ -0,0 +1,169 @@
+"""
+Lecture d'un PNG par bandes horizontales.
+Le flux IDAT est décompressé au fil de l'eau ; chaque bande est défiltrée par
+le décodeur C de PIL, à partir d'un petit PNG reconstitué : la mémoire
+utilisée dépend de la hauteur de bande, pas de la taille de l'image.
+"""
+import io
+import struct
+import zlib
+import numpy as np
+from PIL import Image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+READ_BLOCK    = 1 << 16  # octets lus à la fois dans un chunk IDAT
+INFLATE_LIMIT = 1 << 20  # octets décompressés au plus par appel à zlib
+
+# Nombre de canaux par type de couleur PNG
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+class UnsupportedPNG(Exception):
+    """Le fichier n'est pas un PNG lisible par bandes (le décodage complet reste possible)"""
+
+
+class PngStripReader:
+    """
+    Lecteur de PNG par bandes.
+    Formats pris en charge : non entrelacé, 8 bits par canal, ou palette / niveaux
+    de gris en 1, 2 ou 4 bits.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE:
+                raise UnsupportedPNG("signature PNG absente")
+            self._read_header(f)
+
+    def _read_header(self, f):
+        """Lit IHDR et PLTE (les chunks situés avant les données)"""
+        self.palette = None
+        while True:
+            length, kind = struct.unpack(">I4s", f.read(8))
+            if kind == b"IDAT":
+                break
+            data = f.read(length)
+            f.read(4)  # CRC
+
+            if kind == b"IHDR":
+                (self.width, self.height, self.bit_depth, self.color_type,
+                 _, _, interlace) = struct.unpack(">IIBBBBB", data)
+                if interlace:
+                    raise UnsupportedPNG("PNG entrelacé")
+                if self.color_type not in CHANNELS:
+                    raise UnsupportedPNG(f"type de couleur {self.color_type}")
+                if self.bit_depth != 8 and not (self.bit_depth in (1, 2, 4) and self.color_type in (0, 3)):
+                    raise UnsupportedPNG(f"profondeur {self.bit_depth} bits")
+            elif kind == b"PLTE":
+                self.palette = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            elif kind == b"IEND":
+                raise UnsupportedPNG("aucune donnée IDAT")
+
+        self.channels = CHANNELS[self.color_type]
+        self.stride   = (self.width * self.channels * self.bit_depth + 7) // 8
+
+    # ── Flux de données ──────────────────────────────────────────────────────
+
+    def _idat_blocks(self, f):
+        """Parcourt les chunks IDAT par blocs de READ_BLOCK octets"""
+        length, kind = struct.unpack(">I4s", f.read(8))
+        while kind == b"IDAT":
+            while length > 0:
+                block = f.read(min(length, READ_BLOCK))
+                length -= len(block)
+                yield block
+            f.read(4)  # CRC
+            length, kind = struct.unpack(">I4s", f.read(8))
+
+    def _raw_rows(self):
+        """Lignes brutes décompressées (octet de filtre + données), une à une"""
+        with open(self.path, "rb") as f:
+            f.read(8)
+            while True:  # se placer sur le premier IDAT
+                length, kind = struct.unpack(">I4s", f.read(8))
+                if kind == b"IDAT":
+                    f.seek(-8, 1)
+                    break
+                f.seek(length + 4, 1)
+
+            inflater = zlib.decompressobj()
+            buffer = bytearray()
+            row_size = self.stride + 1
+            for block in self._idat_blocks(f):
+                data = block
+                while data:
+                    buffer += inflater.decompress(data, INFLATE_LIMIT)
+                    data = inflater.unconsumed_tail
+                    while len(buffer) >= row_size:
+                        yield bytes(buffer[:row_size])
+                        del buffer[:row_size]
+
+    # ── Défiltrage ───────────────────────────────────────────────────────────
+
+    def _strip_png(self, prev, rows):
+        """
+        PNG autonome d'une bande : la dernière ligne reconstruite (filtre 0)
+        suivie des lignes brutes de la bande, pour que leurs filtres Up, Average
+        et Paeth s'appuient sur la bonne ligne précédente.
+        Les niveaux de gris de moins de 8 bits sont écrits comme une palette
+        (mêmes octets) pour récupérer les valeurs brutes.
+        """
+        color_type = self.color_type if self.bit_depth == 8 else 3
+        header = struct.pack(">IIBBBBB", self.width, len(rows) + 1, self.bit_depth, color_type, 0, 0, 0)
+        data = b"\x00" + prev.tobytes() + b"".join(rows)
+        png = PNG_SIGNATURE + _chunk(b"IHDR", header)
+        if color_type == 3:  # seuls les indices sont lus : palette factice
+            png += _chunk(b"PLTE", bytes(3 << self.bit_depth))
+        return png + _chunk(b"IDAT", zlib.compress(data, 0)) + _chunk(b"IEND", b"")
+
+    def _unfilter_strip(self, prev, rows):
+        """
+        Défiltre une bande par le décodeur C de PIL.
+        Retourne (valeurs (h, largeur[, canaux]), dernière ligne reconstruite).
+        """
+        with Image.open(io.BytesIO(self._strip_png(prev, rows))) as img:
+            values = np.asarray(img)
+        last = values[-1]
+        if self.bit_depth < 8:  # réempaquette les indices de la dernière ligne
+            shifts = np.arange(self.bit_depth - 1, -1, -1, dtype=np.uint8)
+            last = np.packbits((last[:, None] >> shifts) & 1)
+        return values[1:], last.reshape(-1)
+
+    def _decode_strip(self, values):
+        """Valeurs défiltrées → indices de palette (h, largeur) ou pixels RGB (h, largeur, 3)"""
+        if self.color_type == 3:
+            return values
+        if self.channels <= 2:  # niveaux de gris (+ alpha)
+            gray = values if values.ndim == 2 else values[..., 0]
+            if self.bit_depth < 8:
+                gray = gray * np.uint8(255 // ((1 << self.bit_depth) - 1))
+            return np.repeat(gray[..., None], 3, axis=2)
+        return values[..., :3]
+
+    # ── API publique ─────────────────────────────────────────────────────────
+
+    def strips(self, strip_height):
+        """
+        Renvoie les bandes successives de strip_height lignes (la dernière peut
+        être plus courte) : indices de palette (h, largeur) pour un PNG indexé,
+        pixels RGB (h, largeur, 3) sinon.
+        """
+        prev = np.zeros(self.stride, dtype=np.uint8)
+        rows = []
+        for y, raw in enumerate(self._raw_rows()):
+            if y >= self.height:
+                break
+            rows.append(raw)
+            if len(rows) == strip_height:
+                values, prev = self._unfilter_strip(prev, rows)
+                yield self._decode_strip(values)
+                rows = []
+        if rows:
+            values, prev = self._unfilter_strip(prev, rows)
+            yield self._decode_strip(values)
+
+
+def _chunk(kind, data):
+    """Chunk PNG : longueur, type, données, CRC"""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
@@ -0,0 +1,268 @@
+"""
+Format binaire des sauvegardes (.efs).
+
+En-tête fixe, puis une suite de sections (étiquette, taille, CRC32, données).
+Les chunks sont rangés par colonnes : un tableau uint8 par champ, suivi des
+tableaux de présence, de propriétaires et de bâtiments ; les soldes des
+joueurs forment une matrice (joueurs x ressources).
+
+Une sauvegarde "delta" ne contient que les chunks modifiés depuis une
+sauvegarde complète de la même session, désignée par son époque.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+import numpy as np
+from .gen_chunk_bdd import CHUNK_COLUMNS, RESOURCE_COLUMNS
+
+SAVE_MAGIC   = b"EFSAVE\r\n"
+SAVE_VERSION = 1
+SAVE_EXTENSION = ".efs"
+
+# magic, version, type (0 complet, 1 delta), largeur, hauteur, session,
+# époque, époque de la sauvegarde de base, date, nombre de sections
+HEADER_FORMAT = "<8sHB5xIIQQQdI"
+SECTION_FORMAT = "<4sQI"  # étiquette, taille, CRC32
+
+KIND_FULL, KIND_DELTA = 0, 1
+
+NO_BUILD = -1  # valeur de "build" pour un chunk sans bâtiment
+
+
+class SaveError(Exception):
+    """Sauvegarde illisible, corrompue ou incompatible"""
+
+
+@dataclass
+class SaveState:
+    """
+    État sauvegardé du monde.
+    Complet : tableaux (hauteur, largeur). Delta : tableaux 1D alignés sur
+    cells (indices y * largeur + x des chunks modifiés).
+    owner contient des indices dans owner_names (0 = sans propriétaire).
+    """
+    width: int
+    height: int
+    columns: dict
+    present: np.ndarray
+    owner: np.ndarray
+    build: np.ndarray
+    owner_names: list = field(default_factory=lambda: [None])
+    ledgers: dict = field(default_factory=dict)
+    manifest: dict = field(default_factory=dict)
+    session: int = 0
+    epoch: int = 0
+    base_epoch: int = 0
+    cells: np.ndarray | None = None
+    created: float = 0.0
+
+    @property
+    def is_delta(self):
+        return self.cells is not None
+
+
+# ── Écriture ─────────────────────────────────────────────────────────────────
+
+def _section(tag, payload):
+    """(en-tête de section, données) ; les tableaux numpy sont écrits sans copie"""
+    if isinstance(payload, np.ndarray):
+        payload = payload.reshape(-1).view(np.uint8)
+    payload = memoryview(payload)
+    return struct.pack(SECTION_FORMAT, tag, len(payload), zlib.crc32(payload)), payload
+
+
+def _save_parts(state: SaveState):
+    """Morceaux successifs du fichier de sauvegarde"""
+    players = sorted(state.ledgers)
+    meta = {
+        "columns":     list(CHUNK_COLUMNS),
+        "resources":   list(RESOURCE_COLUMNS),
+        "owner_names": state.owner_names,
+        "players":     players,
+        "manifest":    state.manifest,
+    }
+    ledgers = np.array(
+        [[state.ledgers[p].get(r, 0) for r in RESOURCE_COLUMNS] for p in players],
+        dtype="<i8",
+    ).reshape(len(players), len(RESOURCE_COLUMNS))
+
+    sections = [_section(b"META", json.dumps(meta).encode("utf-8"))]
+    if state.is_delta:
+        sections.append(_section(b"CELL", np.ascontiguousarray(state.cells, dtype="<u4")))
+    sections += [
+        _section(b"CHNK", np.stack([state.columns[name] for name in CHUNK_COLUMNS]).astype(np.uint8, copy=False)),
+        _section(b"PRES", np.ascontiguousarray(state.present, dtype=bool)),
+        _section(b"OWNR", np.ascontiguousarray(state.owner, dtype="<u2")),
+        _section(b"BILD", np.ascontiguousarray(state.build, dtype="<i4")),
+        _section(b"LEDG", np.ascontiguousarray(ledgers)),
+    ]
+    header = struct.pack(
+        HEADER_FORMAT, SAVE_MAGIC, SAVE_VERSION, KIND_DELTA if state.is_delta else KIND_FULL,
+        state.width, state.height, state.session, state.epoch, state.base_epoch,
+        state.created or time.time(), len(sections),
+    )
+    return [header, *(part for section in sections for part in section)]
+
+
+def write_save(path, state: SaveState):
+    """
+    Écrit un SaveState dans path ; retourne la taille en octets.
+    Écriture atomique : fichier temporaire synchronisé puis renommé, une
+    sauvegarde existante n'est jamais laissée à moitié écrite.
+    """
+    path = str(path)
+    temp = path + ".tmp"
+    size = 0
+    try:
+        with open(temp, "wb") as f:
+            for part in _save_parts(state):
+                size += f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return size
+
+
+# ── Lecture ──────────────────────────────────────────────────────────────────
+
+def decode_save(data) -> SaveState:
+    """Désérialise une sauvegarde (les tableaux sont des vues sur data)"""
+    view = memoryview(data)
+    header_size = struct.calcsize(HEADER_FORMAT)
+    try:
+        (magic, version, kind, width, height, session, epoch, base_epoch,
+         created, count) = struct.unpack_from(HEADER_FORMAT, view)
+    except struct.error:
+        raise SaveError("en-tête tronqué")
+    if magic != SAVE_MAGIC:
+        raise SaveError("ce fichier n'est pas une sauvegarde")
+    if version != SAVE_VERSION:
+        raise SaveError(f"version {version} non prise en charge")
+
+    sections = {}
+    offset = header_size
+    for _ in range(count):
+        try:
+            tag, length, crc = struct.unpack_from(SECTION_FORMAT, view, offset)
+        except struct.error:
+            raise SaveError("section tronquée")
+        offset += struct.calcsize(SECTION_FORMAT)
+        payload = view[offset:offset + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise SaveError(f"section {tag.decode(errors='replace')} corrompue")
+        sections[tag] = payload
+        offset += length
+
+    required = [b"META", b"CHNK", b"PRES", b"OWNR", b"BILD", b"LEDG"]
+    if kind == KIND_DELTA:
+        required.append(b"CELL")
+    missing = [tag.decode() for tag in required if tag not in sections]
+    if missing:
+        raise SaveError(f"sections manquantes : {', '.join(missing)}")
+
+    try:
+        meta = json.loads(bytes(sections[b"META"]).decode("utf-8"))
+        columns, resources = meta["columns"], meta["resources"]
+        owner_names, players, manifest = meta["owner_names"], meta["players"], meta["manifest"]
+    except (ValueError, KeyError, TypeError) as e:  # JSON / UTF-8 invalides, clé absente
+        raise SaveError(f"section META illisible ({e})")
+    if columns != list(CHUNK_COLUMNS):
+        raise SaveError("colonnes de chunk différentes")
+
+    try:
+        if kind == KIND_DELTA:
+            cells = np.frombuffer(sections[b"CELL"], dtype="<u4")
+            shape = (len(cells),)
+        else:
+            cells = None
+            shape = (height, width)
+
+        packed = np.frombuffer(sections[b"CHNK"], dtype=np.uint8).reshape(len(CHUNK_COLUMNS), *shape)
+        present = np.frombuffer(sections[b"PRES"], dtype=bool).reshape(shape)
+        owner = np.frombuffer(sections[b"OWNR"], dtype="<u2").reshape(shape)
+        build = np.frombuffer(sections[b"BILD"], dtype="<i4").reshape(shape)
+        ledger_rows = np.frombuffer(sections[b"LEDG"], dtype="<i8").reshape(len(players), len(resources))
+    except (ValueError, TypeError):  # taille de section incohérente avec l'en-tête / META
+        raise SaveError("taille de section incohérente")
+
+    if cells is not None and len(cells) and int(cells.max()) >= width * height:
+        raise SaveError("chunk hors du monde")
+    if owner.size and int(owner.max()) >= len(owner_names):
+        raise SaveError("propriétaire inconnu")
+    ledgers = {
+        player: dict(zip(resources, row.tolist()))
+        for player, row in zip(players, ledger_rows)
+    }
+
+    return SaveState(
+        width=width,
+        height=height,
+        columns=dict(zip(CHUNK_COLUMNS, packed)),
+        present=present,
+        owner=owner,
+        build=build,
+        owner_names=owner_names,
+        ledgers=ledgers,
+        manifest=manifest,
+        session=session,
+        epoch=epoch,
+        base_epoch=base_epoch,
+        cells=cells,
+        created=created,
+    )
+
+
+def read_save(path) -> SaveState:
+    with open(path, "rb") as f:
+        return decode_save(f.read())
+
+
+def apply_delta(base: SaveState, delta: SaveState) -> SaveState:
+    """Applique une sauvegarde delta à sa sauvegarde complète de base"""
+    if base.is_delta:
+        raise SaveError("la base d'un delta doit être une sauvegarde complète")
+    if (base.session, base.epoch, base.width, base.height) != \
+            (delta.session, delta.base_epoch, delta.width, delta.height):
+        raise SaveError("le delta ne correspond pas à cette sauvegarde de base")
+
+    ys, xs = np.divmod(delta.cells.astype(np.int64), base.width)
+
+    # Propriétaires : indices du delta ramenés dans la table de noms de la base
+    owner_names = list(base.owner_names)
+    index_of = {name: i for i, name in enumerate(owner_names)}
+    remap = np.zeros(len(delta.owner_names), dtype=np.uint16)
+    for i, name in enumerate(delta.owner_names):
+        if name is not None and name not in index_of:
+            index_of[name] = len(owner_names)
+            owner_names.append(name)
+        remap[i] = index_of.get(name, 0)
+
+    columns = {name: base.columns[name].copy() for name in CHUNK_COLUMNS}
+    for name in CHUNK_COLUMNS:
+        columns[name][ys, xs] = delta.columns[name]
+    present, owner, build = base.present.copy(), base.owner.copy(), base.build.copy()
+    present[ys, xs] = delta.present
+    owner[ys, xs] = remap[delta.owner]
+    build[ys, xs] = delta.build
+
+    return SaveState(
+        width=base.width,
+        height=base.height,
+        columns=columns,
+        present=present,
+        owner=owner,
+        build=build,
+        owner_names=owner_names,
+        ledgers=delta.ledgers,
+        manifest=delta.manifest or base.manifest,
+        session=delta.session,
+        epoch=delta.epoch,
+        created=delta.created,
+    )
@@ -0,0 +1,106 @@
+"""
+Bibliothèque de mondes générés.
+Chaque monde (carte, seed, version du générateur) a sa propre BDD dans
+data/worlds/ ; les moins récemment utilisés sont supprimés au-delà d'un
+budget disque.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from path import PATH
+from utils.logger import Logger
+from utils.mmap_store import MMAP_SUFFIX
+
+logger = Logger()
+
+# Fichiers associés à une BDD (WAL et mémoire partagée SQLite, chunks mmap)
+DB_SUFFIXES = ("", "-wal", "-shm", MMAP_SUFFIX)
+# BDD unique d'avant la bibliothèque de mondes, reprise une fois puis renommée
+LEGACY_DB       = "chunk_base.db"
+LEGACY_IMPORTED = ".imported"
+
+
+class WorldStore:
+    """Index LRU des BDD de mondes, rangées côte à côte"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.base = Path(os.path.join(PATH, "data/worlds/"))
+        self.base.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.base / "index.json"
+        self.max_bytes = max_bytes
+        self.index = self._load_index()
+
+    @staticmethod
+    def world_key(manifest):
+        """Clé d'un monde : (empreinte de la carte, seed, version du générateur)"""
+        return f"{manifest['map_hash'][:16]}_{manifest['seed']}_v{manifest['generator_version']}"
+
+    # ── Index ────────────────────────────────────────────────────────────────
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with open(self.index_path, "w") as f:
+            json.dump(self.index, f)
+
+    def _size_of(self, entry):
+        size = 0
+        for suffix in DB_SUFFIXES:
+            path = self.base / (entry["file"] + suffix)
+            if path.exists():
+                size += path.stat().st_size
+        return size
+
+    # ── API publique ─────────────────────────────────────────────────────────
+
+    def get_world_path(self, manifest):
+        """
+        Retourne le chemin de la BDD de ce monde (créée à la génération si besoin)
+        et le marque comme le plus récemment utilisé.
+        """
+        key = self.world_key(manifest)
+        entry = self.index.setdefault(key, {"file": f"world_{key}.db"})
+        entry["last_used"] = time.time()
+        self._save_index()
+
+        self.evict(keep=key)
+        return str(self.base / entry["file"])
+
+    def legacy_database(self):
+        """Chemin de l'ancienne BDD unique (data/chunk_base.db) si elle reste à reprendre, sinon None"""
+        path = self.base.parent / LEGACY_DB
+        return str(path) if path.exists() else None
+
+    def retire_legacy_database(self, path):
+        """Renomme l'ancienne BDD une fois reprise : elle n'est plus relue"""
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.replace(path, path + LEGACY_IMPORTED)
+
+    def evict(self, keep=None):
+        """Supprime les mondes les moins récemment utilisés jusqu'à tenir dans max_bytes"""
+        total = sum(self._size_of(entry) for entry in self.index.values())
+        by_age = sorted(self.index.items(), key=lambda item: item[1].get("last_used", 0))
+
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            size = self._size_of(entry)
+            for suffix in DB_SUFFIXES:
+                path = self.base / (entry["file"] + suffix)
+                if path.exists():
+                    path.unlink()
+            del self.index[key]
+            total -= size
+            logger.info(f"Monde {key} supprimé du cache ({size // 1024} Ko)")
+
+        self._save_index()
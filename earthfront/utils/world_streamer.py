@@ -0,0 +1,129 @@
+"""
+Génération paresseuse du monde, pilotée par la caméra.
+Les tuiles de chunks proches du viewport sont générées en priorité dans un
+thread de fond, le reste du monde est complété ensuite à basse priorité.
+"""
+import threading
+import time
+from .gen_chunk_bdd import ChunkDataExtractor, split_bands
+from .logger import Logger
+
+logger = Logger()
+
+TILE_HEIGHT       = 8      # lignes de chunks par tuile (une tuile = une bande x TILE_HEIGHT)
+FOCUS_MARGIN      = 4      # chunks autour du viewport considérés comme prioritaires
+BACKGROUND_PAUSE  = 0.005  # pause (s) entre deux tuiles hors viewport
+
+
+class LazyWorldGenerator:
+    """Génère les chunks manquants tuile par tuile, la zone visible d'abord"""
+
+    def __init__(self, handler, seed, width, height, done_bands=()):
+        """
+        handler    : DatabaseHandler qui fournit la connexion et l'écriture des tuiles
+        done_bands : bandes (x0, x1) déjà validées dans la BDD, ignorées
+        """
+        self.handler = handler
+        self.width   = width
+        self.height  = height
+        # La carte est classée dans le thread de fond, pas avant la première image
+        self.extractor = ChunkDataExtractor(seed=seed, lazy=True)
+
+        # Tuiles restantes, et nombre de tuiles restantes par bande
+        self._pending = set()
+        self._band_left = {}
+        for band in split_bands(width):
+            if band in done_bands:
+                continue
+            tiles = [(band, y0, min(y0 + TILE_HEIGHT, height)) for y0 in range(0, height, TILE_HEIGHT)]
+            self._pending.update(tiles)
+            self._band_left[band] = len(tiles)
+
+        self._total = len(self._pending)
+        self._focus = None
+        self._lock  = threading.Lock()
+        self._stop  = threading.Event()
+        self._thread = None
+
+    # ── API publique ─────────────────────────────────────────────────────────
+
+    def start(self):
+        if not self._pending:
+            return
+        self._thread = threading.Thread(target=self._run, name="lazy-world-gen", daemon=True)
+        self._thread.start()
+        logger.info(f"Génération paresseuse démarrée ({self._total} tuiles)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def set_focus(self, x0, y0, x1, y1):
+        """Zone (en chunks, bornes incluses) actuellement visible à l'écran"""
+        with self._lock:
+            self._focus = (x0 - FOCUS_MARGIN, y0 - FOCUS_MARGIN, x1 + FOCUS_MARGIN, y1 + FOCUS_MARGIN)
+
+    def generate_chunk(self, x, y):
+        """
+        Génère un chunk de façon synchrone (mêmes valeurs que le thread de fond).
+        Tant que la carte n'est pas classée, seule la ligne de chunks est lue.
+        """
+        return self.extractor.get_chunk_data(x, y)
+
+    @property
+    def done(self):
+        with self._lock:
+            return not self._pending
+
+    # ── Thread de fond ───────────────────────────────────────────────────────
+
+    def _next_tile(self):
+        """Retourne (tuile, dans_le_focus), la tuile visible la plus proche d'abord"""
+        with self._lock:
+            if not self._pending:
+                return None, False
+
+            if self._focus is not None:
+                fx0, fy0, fx1, fy1 = self._focus
+                cx, cy = (fx0 + fx1) / 2, (fy0 + fy1) / 2
+                visible = [
+                    tile for tile in self._pending
+                    if tile[0][0] <= fx1 and tile[0][1] > fx0 and tile[1] <= fy1 and tile[2] > fy0
+                ]
+                if visible:
+                    tile = min(visible, key=lambda t: ((t[0][0] + t[0][1]) / 2 - cx) ** 2
+                                                      + ((t[1] + t[2]) / 2 - cy) ** 2)
+                    self._pending.discard(tile)
+                    return tile, True
+
+            tile = min(self._pending)
+            self._pending.discard(tile)
+            return tile, False
+
+    def _run(self):
+        self.handler.open_generation_connection()
+        try:
+            self.extractor.load_terrain()
+            while not self._stop.is_set():
+                tile, in_focus = self._next_tile()
+                if tile is None:
+                    break
+
+                (x0, x1), y0, y1 = tile
+                rows = self.extractor.get_region_rows(x0, x1, y0, y1)
+
+                self._band_left[(x0, x1)] -= 1
+                band_done = (x0, x1) if self._band_left[(x0, x1)] == 0 else None
+                self.handler.write_generated_rows(self.handler.open_connection(), rows, band_done)
+
+                if not in_focus:
+                    time.sleep(BACKGROUND_PAUSE)
+        except Exception as e:
+            logger.error(f"Erreur génération paresseuse : {e}")
+        finally:
+            self.handler.release_connection()
+
+        if self.done:
+            logger.info("Génération paresseuse terminée")